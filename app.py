@@ -1,19 +1,44 @@
+import atexit
+import hashlib
+import json
 import os
+import queue
 import shutil
 import smtplib
 import subprocess
 import sys
 import tempfile
 import threading
+import tracemalloc
+import uuid
 import zipfile
-from email.message import EmailMessage
+from collections import deque
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Tuple
 
 from email_validator import EmailNotValidError, validate_email
-from flask import Flask, render_template_string, request, send_from_directory
+from flask import (
+    Flask,
+    Response,
+    jsonify,
+    render_template_string,
+    request,
+    send_from_directory,
+    stream_with_context,
+)
+from markupsafe import escape
 import time
 
+from job_backend import BACKENDS, JobWorker, create_job_backend
+from job_queue import QueueFull, request_fingerprint
+from mailer import Outbox, SmtpSettings, build_mime_file, send_mime_file
+from mashup_engine import MashupTimeout, get_engine
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Counter, Gauge, Histogram, Registry
+from redis_client import RedisClient
+from result_cache import Janitor, RedisResultCache, ResultCache
+from status_store import FINAL_STATUSES, RedisStatusStore, StatusStore
+
 # Try to load .env file if python-dotenv is installed
 try:
     from dotenv import load_dotenv
@@ -21,10 +46,38 @@ try:
 except ImportError:
     pass
 
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
 app = Flask(__name__)
 
 BASE_DIR = Path(__file__).resolve().parent
 CLI_SCRIPT = BASE_DIR / "102303052.py"
+# Subprocess output handling: hard timeout plus bounds on what is buffered
+CLI_TIMEOUT_SECONDS = 1200
+CLI_LINE_QUEUE_SIZE = 1000
+CLI_TAIL_LINES = 200
+CLI_MAX_LINE_CHARS = 4096
+# Email packaging: include MP3 + MP4 + manifest instead of just the MP3,
+# and optionally trace Python allocations during packaging/email
+EMAIL_BUNDLE = os.getenv("MASHUP_EMAIL_BUNDLE", "false").lower() in {"1", "true", "yes"}
+MEASURE_MEMORY = os.getenv("MASHUP_MEASURE_MEMORY", "false").lower() in {"1", "true", "yes"}
+# Run jobs with the warm in-process engine; set to false to spawn the CLI.
+IN_PROCESS_ENGINE = os.getenv("MASHUP_IN_PROCESS", "true").lower() in {"1", "true", "yes"}
+# RMS level (dBFS) that "Normalize loudness" brings every clip to
+MIX_TARGET_LEVEL = float(os.getenv("MASHUP_TARGET_LEVEL", "-16"))
+MAX_CROSSFADE_SECONDS = 10
+
+
+def warm_engine() -> None:
+    try:
+        get_engine()
+        print("Mashup engine warmed up.")
+    except Exception as e:
+        print(f"Mashup engine warm-up failed: {e}")
+
 
 FORM_HTML = """
 <!doctype html>
@@ -71,6 +124,13 @@ FORM_HTML = """
       border-radius: 8px;
       font-size: 14px;
     }
+    label.check {
+      font-weight: 400;
+    }
+    label.check input {
+      width: auto;
+      margin-right: 8px;
+    }
     button {
       margin-top: 18px;
       width: 100%;
@@ -120,6 +180,11 @@ FORM_HTML = """
       <label for="audio_duration">Duration of Each Clip in Seconds (must be > 20)</label>
       <input id="audio_duration" name="audio_duration" type="number" min="21" value="{{ values.audio_duration }}" required>
 
+      <label for="crossfade">Crossfade Between Clips in Seconds (optional, 0 for hard cuts)</label>
+      <input id="crossfade" name="crossfade" type="number" min="0" max="10" step="0.5" value="{{ values.crossfade }}">
+
+      <label class="check"><input name="normalize" type="checkbox" value="1" {% if values.normalize %}checked{% endif %}>Normalize loudness so every clip plays at the same level</label>
+
       <label for="email">Email ID</label>
       <input id="email" name="email" type="email" value="{{ values.email }}" required>
 
@@ -134,7 +199,7 @@ FORM_HTML = """
 """
 
 
-def parse_form(form) -> Tuple[str, int, int, str]:
+def parse_form(form) -> Tuple[str, int, int, str, dict]:
     singer_name = form.get("singer_name", "").strip()
     if not singer_name:
         raise ValueError("Singer name is required.")
@@ -153,23 +218,162 @@ def parse_form(form) -> Tuple[str, int, int, str]:
     if audio_duration <= 20:
         raise ValueError("Audio duration must be greater than 20.")
 
+    try:
+        crossfade = float(form.get("crossfade", "").strip() or 0)
+    except ValueError:
+        raise ValueError("Crossfade must be a number of seconds.")
+    if not 0 <= crossfade <= MAX_CROSSFADE_SECONDS:
+        raise ValueError(f"Crossfade must be between 0 and {MAX_CROSSFADE_SECONDS} seconds.")
+    mix = {"crossfade": crossfade, "normalize": bool(form.get("normalize"))}
+
     email_raw = form.get("email", "").strip()
     try:
         email = validate_email(email_raw, check_deliverability=False).normalized
     except EmailNotValidError:
         raise ValueError("Email ID is not valid.")
 
-    return singer_name, number_of_videos, audio_duration, email
+    return singer_name, number_of_videos, audio_duration, email, mix
+
+
+# Already-compressed media gains almost nothing from deflate, so it is stored.
+STORED_SUFFIXES = {".mp3", ".mp4", ".m4a", ".aac", ".webm", ".ogg", ".opus", ".zip"}
 
 
-def create_zip_file(source_file: Path) -> Path:
+def create_zip_file(source_file: Path, extra_files=(), manifest: dict = None) -> Path:
+    """Zip ``source_file`` (plus optional extra artifacts and a manifest).
+
+    ``ZipFile.write`` copies each file in chunks, so the archive is streamed
+    from disk rather than built in memory.
+    """
     zip_path = source_file.with_suffix(".zip")
-    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as archive:
-        archive.write(source_file, arcname=source_file.name)
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        for path in [source_file, *extra_files]:
+            compression = (
+                zipfile.ZIP_STORED if path.suffix.lower() in STORED_SUFFIXES else zipfile.ZIP_DEFLATED
+            )
+            archive.write(path, arcname=path.name, compress_type=compression)
+        if manifest is not None:
+            archive.writestr(
+                "manifest.json",
+                json.dumps(manifest, indent=2),
+                compress_type=zipfile.ZIP_DEFLATED,
+            )
     return zip_path
 
 
-def run_cli_mashup(singer_name: str, number_of_videos: int, audio_duration: int, output_file: Path, file_id: str = None) -> None:
+# Traced stages run one at a time so tracemalloc's global trace (and its
+# peak) belongs to a single stage.
+MEMORY_TRACE_LOCK = threading.Lock()
+
+
+@contextmanager
+def measure_peak_memory(label: str):
+    """Log how much memory a stage added at its peak.
+
+    With MASHUP_MEASURE_MEMORY=true the stage's Python allocations are
+    traced from its start, so the peak is this stage's delta rather than
+    the process total. Other jobs' threads still allocate into the same
+    trace, so use MASHUP_WORKERS=1 for a dedicated measurement run.
+    Otherwise only the RSS high-water mark is logged; it covers the whole
+    process lifetime and every job it has run.
+    """
+    if not MEASURE_MEMORY:
+        try:
+            yield
+        finally:
+            print(f"[MEMORY] {label}: process RSS high-water mark {max_rss_mb():.1f} MB")
+        return
+    with MEMORY_TRACE_LOCK:
+        rss_before = max_rss_mb()
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            rss_after = max_rss_mb()
+            print(
+                f"[MEMORY] {label}: peak allocations during the stage {peak / 1048576:.1f} MB, "
+                f"RSS high-water mark {rss_after:.1f} MB (+{rss_after - rss_before:.1f} MB)"
+            )
+
+
+def max_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    return peak / 1048576 if sys.platform == "darwin" else peak / 1024
+
+
+def describe_failure(output: str, singer_name: str) -> str:
+    """Turn raw pipeline output into a user-facing error, if one is recognised."""
+    if "Could not download" in output:
+        return f"YouTube: No videos found for '{singer_name}'. Try a different singer or check spelling."
+    if "403" in output or "429" in output:
+        return "YouTube blocked the request. Try again in a few minutes or with fewer videos."
+    return ""
+
+
+def run_engine_mashup(
+    singer_name: str,
+    number_of_videos: int,
+    audio_duration: int,
+    output_file: Path,
+    file_id: str = None,
+    video_output: Path = None,
+    stream_dir: Path = None,
+    crossfade: float = 0.0,
+    normalize: bool = False,
+) -> None:
+    """Run the mashup inside this process using the warm shared engine."""
+    print(f"Starting in-process mashup for {singer_name}")
+    update_status(file_id, "Processing", f"Downloading {number_of_videos} videos for {singer_name}...")
+
+    def on_progress(stage, message, data):
+        if stage == "span":
+            observe_span(message, data)
+        elif file_id:
+            update_status(
+                file_id,
+                "Processing",
+                message,
+                stage=stage,
+                percent=progress_percent(stage, data),
+            )
+
+    try:
+        get_engine().run(
+            singer_name,
+            number_of_videos,
+            audio_duration,
+            output_file,
+            video_output=video_output,
+            stream_dir=stream_dir,
+            crossfade=crossfade,
+            target_level=MIX_TARGET_LEVEL if normalize else None,
+            progress=on_progress,
+            timeout=1200,
+        )
+    except MashupTimeout:
+        raise RuntimeError("YouTube download timed out after 20 minutes. Try fewer videos.")
+    except Exception as e:
+        print(f"Engine execution error: {e}")
+        raise RuntimeError(describe_failure(str(e), singer_name) or str(e))
+    print(f"Mashup completed successfully: {output_file}")
+
+
+def run_cli_mashup(
+    singer_name: str,
+    number_of_videos: int,
+    audio_duration: int,
+    output_file: Path,
+    file_id: str = None,
+    video_output: Path = None,
+    stream_dir: Path = None,
+    crossfade: float = 0.0,
+    normalize: bool = False,
+) -> None:
     # Ensure CLI script exists
     if not CLI_SCRIPT.exists():
          raise RuntimeError(f"CLI script not found at {CLI_SCRIPT}")
@@ -182,47 +386,105 @@ def run_cli_mashup(singer_name: str, number_of_videos: int, audio_duration: int,
         str(audio_duration),
         str(output_file),
     ]
-    # Capture output for debugging logs if needed
+    if video_output is not None:
+        command += ["--video-output", str(video_output)]
+    if stream_dir is not None:
+        command += ["--stream-dir", str(stream_dir)]
+    if crossfade:
+        command += ["--crossfade", str(crossfade)]
+    if normalize:
+        command += ["--normalize", "--target-level", str(MIX_TARGET_LEVEL)]
     print(f"Starting CLI command: {' '.join(command)}")
     update_status(file_id, "Processing", f"Downloading {number_of_videos} videos for {singer_name}...")
     
-    try:
-        # Use communicate with timeout to prevent hanging
-        process = subprocess.Popen(
-            command, 
-            stdout=subprocess.PIPE, 
-            stderr=subprocess.PIPE, 
-            text=True, 
-            bufsize=1
-        )
-        
+    deadline = time.monotonic() + CLI_TIMEOUT_SECONDS
+    env = dict(os.environ, PYTHONUNBUFFERED="1")  # deliver lines as they happen
+    process = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        bufsize=1,
+        env=env,
+    )
+
+    # stdout is pumped through a bounded queue (backpressure on the child
+    # rather than unbounded buffering); stderr only keeps a short tail.
+    lines = queue.Queue(maxsize=CLI_LINE_QUEUE_SIZE)
+    stdout_tail = deque(maxlen=CLI_TAIL_LINES)
+    stderr_tail = deque(maxlen=CLI_TAIL_LINES)
+    notable = deque(maxlen=CLI_TAIL_LINES)
+
+    stop_pumping = threading.Event()
+
+    def offer(line):
+        # Give up once the consumer has stopped reading (timeout or error),
+        # so this thread never blocks forever on a full queue
+        while not stop_pumping.is_set():
+            try:
+                lines.put(line, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def pump_stdout():
         try:
-            stdout_data, stderr_data = process.communicate(timeout=1200)  # 20 minute timeout
-        except subprocess.TimeoutExpired:
-            process.kill()
-            raise RuntimeError(f"YouTube download timed out after 20 minutes. Try fewer videos.")
-        
-        # Parse and log output
-        if stdout_data:
-            for line in stdout_data.split('\n'):
-                line = line.strip()
-                if not line:
-                    continue
-                print(f"CLI: {line}")
-                if "[PROGRESS]" in line and file_id:
-                    msg = line.replace("[PROGRESS]", "").strip()
-                    update_status(file_id, "Processing", msg)
-        
+            for line in iter(lambda: process.stdout.readline(CLI_MAX_LINE_CHARS), ""):
+                if not offer(line):
+                    return
+        finally:
+            offer(None)
+
+    def pump_stderr():
+        for line in iter(lambda: process.stderr.readline(CLI_MAX_LINE_CHARS), ""):
+            stderr_tail.append(line.rstrip())
+
+    readers = [
+        threading.Thread(target=pump_stdout, daemon=True),
+        threading.Thread(target=pump_stderr, daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError("YouTube download timed out after 20 minutes. Try fewer videos.")
+            try:
+                line = lines.get(timeout=min(1.0, remaining))
+            except queue.Empty:
+                continue
+            if line is None:
+                break
+            line = line.strip()
+            if not line:
+                continue
+            print(f"CLI: {line}")
+            stdout_tail.append(line)
+            if "Could not download" in line or "403" in line or "429" in line:
+                notable.append(line)
+            if line.startswith("[SPAN]"):
+                try:
+                    fields = json.loads(line[len("[SPAN]"):])
+                    observe_span(fields.pop("span"), fields)
+                except (ValueError, KeyError) as e:
+                    print(f"Unreadable span line: {e}")
+            elif "[PROGRESS]" in line and file_id:
+                msg = line.replace("[PROGRESS]", "").strip()
+                update_status(file_id, "Processing", msg)
+
+        process.wait(timeout=max(1.0, deadline - time.monotonic()))
+        for reader in readers:
+            reader.join(timeout=5)
+
         if process.returncode != 0:
-            error_msg = stderr_data[:300] if stderr_data else "Unknown error"
+            stderr_data = "\n".join(stderr_tail)
+            error_msg = stderr_data[-300:] if stderr_data else "Unknown error"
             print(f"CLI Error (exit code {process.returncode}): {error_msg}")
-            # Try to extract meaningful error from output
-            if "Could not download" in stdout_data:
-                raise RuntimeError(f"YouTube: No videos found for '{singer_name}'. Try a different singer or check spelling.")
-            elif "403" in stdout_data or "429" in stdout_data:
-                raise RuntimeError("YouTube blocked the request. Try again in a few minutes or with fewer videos.")
-            else:
-                raise RuntimeError(error_msg)
+            output = "\n".join(list(notable) + list(stdout_tail))
+            raise RuntimeError(describe_failure(output, singer_name) or error_msg)
         
         print(f"CLI completed successfully: {output_file}")
     
@@ -231,6 +493,26 @@ def run_cli_mashup(singer_name: str, number_of_videos: int, audio_duration: int,
     except Exception as e:
         print(f"CLI execution error: {e}")
         raise
+    finally:
+        stop_pumping.set()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        # The child is gone, so its pipes hit EOF and the readers exit
+        for reader in readers:
+            reader.join(timeout=5)
+        process.stdout.close()
+        process.stderr.close()
+
+
+def mashup_email(singer_name: str, number_of_videos: int, audio_duration: int) -> Tuple[str, str]:
+    body = (
+        "Your mashup file is attached.\n\n"
+        f"Singer: {singer_name}\n"
+        f"Videos: {number_of_videos}\n"
+        f"Clip duration: {audio_duration} seconds\n"
+    )
+    return "Mashup Assignment Output", body
 
 
 def send_email_with_attachment(
@@ -255,25 +537,17 @@ def send_email_with_attachment(
         print("Error: SENDER_EMAIL missing.")
         return
 
-    message = EmailMessage()
-    message["Subject"] = "Mashup Assignment Output"
-    message["From"] = sender_email
-    message["To"] = receiver_email
-    message.set_content(
-        "Your mashup file is attached.\n\n"
-        f"Singer: {singer_name}\n"
-        f"Videos: {number_of_videos}\n"
-        f"Clip duration: {audio_duration} seconds\n"
-    )
-
+    message_path = None
+    subject, body = mashup_email(singer_name, number_of_videos, audio_duration)
     try:
-        with attachment_path.open("rb") as file_obj:
-            data = file_obj.read()
-        message.add_attachment(
-            data,
-            maintype="application",
-            subtype="zip",
-            filename=attachment_path.name,
+        # The message is spooled to disk and streamed to the server, so the
+        # attachment is never held in memory as a whole.
+        message_path = build_mime_file(
+            sender=sender_email,
+            recipient=receiver_email,
+            subject=subject,
+            body=body,
+            attachment_path=attachment_path,
         )
 
         print(f"Sending email to {receiver_email}...")
@@ -281,85 +555,512 @@ def send_email_with_attachment(
             if use_tls:
                 smtp.starttls()
             smtp.login(smtp_username, smtp_password)
-            smtp.send_message(message)
+            send_mime_file(smtp, sender_email, [receiver_email], message_path)
         print("Email sent successfully.")
     except Exception as e:
         print(f"Failed to send email: {e}")
+    finally:
+        if message_path is not None:
+            message_path.unlink(missing_ok=True)
+
+
+# Global directory for results (persists as long as app runs). With
+# several hosts it must be shared storage so any web worker can serve any
+# job's preview and zip.
+STATIC_RESULTS_DIR = Path(os.getenv("MASHUP_RESULTS_DIR") or "static_results")
+STATIC_RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+# Host-local state: the SQLite files and the email spool. Kept out of
+# MASHUP_RESULTS_DIR, which may be network storage, where SQLite locking
+# is unreliable. The redis backend keeps the result index and delivery
+# status in Redis instead, so every host sees them.
+STATE_DIR = Path(os.getenv("MASHUP_STATE_DIR") or "static_results")
+STATE_DIR.mkdir(parents=True, exist_ok=True)
+
+# Where jobs wait and who runs them: "local" runs them on this process's
+# threads; "sqlite" (one host) and "redis" (several) share the queue and
+# job status with worker.py processes and every other web worker.
+JOB_BACKEND_KIND = os.getenv("MASHUP_JOB_BACKEND", "local").lower()
+if JOB_BACKEND_KIND not in BACKENDS:
+    raise ValueError(f"MASHUP_JOB_BACKEND must be one of {', '.join(BACKENDS)}, not {JOB_BACKEND_KIND!r}")
+REDIS_URL = os.getenv("MASHUP_REDIS_URL", "redis://localhost:6379/0")
+
+if JOB_BACKEND_KIND == "redis":
+    STATUS_STORE = RedisStatusStore(RedisClient.from_url(REDIS_URL))
+else:
+    STATUS_STORE = StatusStore(
+        Path(os.getenv("MASHUP_STATUS_DB") or STATE_DIR / "jobs.sqlite3"),
+        shared=JOB_BACKEND_KIND == "sqlite",
+    )
+
+# Long-lived requests are capped so a waiting browser never pins a worker
+# thread for long; EventSource reconnects on its own.
+SSE_MAX_SECONDS = 25
+LONG_POLL_MAX_SECONDS = 25
+# Each open SSE stream or long-poll holds a server thread (gunicorn
+# --threads 16 on Render). At most this many wait at once. The rest get
+# an immediate answer and poll again, so threads stay free for form posts
+# and downloads.
+MAX_WAITING_REQUESTS = int(os.getenv("MASHUP_MAX_STREAMS", "4"))
+WAIT_SLOTS = threading.BoundedSemaphore(max(1, MAX_WAITING_REQUESTS))
+# Reconnect delay (ms) sent to EventSource clients turned away when the
+# slots are full.
+SSE_BUSY_RETRY_MS = 5000
+
+# Progressive HLS previews, one directory per job, published while the
+# mashup is still rendering.
+STREAMS_DIR = STATIC_RESULTS_DIR / "streams"
+STREAM_PLAYLIST = "index.m3u8"
+# hls.js for browsers without native HLS. A copy vendored at static/hls.min.js
+# is served same-origin; otherwise the pinned CDN build is only loaded when
+# its Subresource Integrity hash is configured.
+HLS_JS_VERSION = "1.5.13"
+HLS_JS_CDN_URL = f"https://cdn.jsdelivr.net/npm/hls.js@{HLS_JS_VERSION}/dist/hls.min.js"
+HLS_JS_INTEGRITY = os.getenv("MASHUP_HLS_JS_INTEGRITY", "")
+
+
+def hls_js_source() -> dict:
+    """Where the result page loads hls.js from; ``url`` is None if nowhere."""
+    if (BASE_DIR / "static" / "hls.min.js").exists():
+        return {"url": "/static/hls.min.js", "integrity": ""}
+    if HLS_JS_INTEGRITY:
+        return {"url": HLS_JS_CDN_URL, "integrity": HLS_JS_INTEGRITY}
+    return {"url": None, "integrity": ""}
+
+
+def stream_dir_for(file_id):
+    return STREAMS_DIR / Path(file_id).stem
+
+
+def update_status(file_id, status, message="", stage=None, percent=None):
+    """Record a job's status for the result page and the JSON/SSE API."""
+    if not file_id:
+        return
+    STATUS_STORE.update(file_id, status, message, stage=stage, percent=percent)
+
 
+def progress_percent(stage, data):
+    """Map a pipeline progress event onto an overall 0-100 estimate."""
+    if stage == "download" and data.get("total"):
+        return 60.0 * data["done"] / data["total"]
+    if stage == "merge":
+        if data.get("percent") is not None:
+            return 60.0 + 0.35 * data["percent"]
+        if data.get("clips"):
+            return 60.0 + 35.0 * data.get("clip", 0) / data["clips"]
+    # Mixing replaces the merge: the mix pass, then a single encode
+    if stage == "mix" and data.get("clips"):
+        return 60.0 + 20.0 * data["clip"] / data["clips"]
+    if stage == "encode" and data.get("percent") is not None:
+        return 80.0 + 0.15 * data["percent"]
+    if stage == "video":
+        return 95.0
+    return None
 
-# Global directory for results (persists as long as app runs)
-STATIC_RESULTS_DIR = Path("static_results")
-STATIC_RESULTS_DIR.mkdir(exist_ok=True)
 
-def update_status(file_id, status, message=""):
-    """Write status to a file for the frontend to poll."""
-    status_file = STATIC_RESULTS_DIR / f"{file_id}.txt"
-    with open(status_file, "w") as f:
-        f.write(f"{status}|{message}")
+def job_view(file_id):
+    job = STATUS_STORE.get(file_id)
+    if job is None:
+        return None
+    position = JOB_BACKEND.position(file_id)
+    if position:
+        job["status"] = "Queued"
+        job["message"] = f"Waiting in queue (position {position})..."
+    job["queue_position"] = position
+    job["delivery"] = delivery_status(file_id)
+    stream_dir = stream_dir_for(file_id)
+    job["stream"] = (
+        f"/stream/{stream_dir.name}/{STREAM_PLAYLIST}"
+        if (stream_dir / STREAM_PLAYLIST).exists() else None
+    )
+    return job
+
+
+# Prometheus metrics for /metrics. Stage timings come from the pipeline's
+# spans (progress events in-process, [SPAN] lines from the CLI) plus the
+# app's own spans around queueing, zipping and email delivery.
+METRICS = Registry()
+STAGE_SECONDS = METRICS.register(Histogram(
+    "mashup_stage_seconds",
+    "Time spent in each pipeline stage.",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200),
+    labels=("stage", "outcome"),
+))
+DOWNLOAD_BYTES = METRICS.register(Histogram(
+    "mashup_download_bytes",
+    "Bytes fetched per downloaded video.",
+    buckets=tuple(256 * 1024 * 4 ** power for power in range(6)),
+))
+JOB_CLIPS = METRICS.register(Histogram(
+    "mashup_job_clips",
+    "Clips merged into each finished mashup.",
+    buckets=(1, 2, 5, 10, 20, 30, 50, 100),
+))
+METRICS.register(Gauge(
+    "mashup_active_jobs", "Jobs currently running.", function=lambda: JOB_BACKEND.active()
+))
+METRICS.register(Gauge(
+    "mashup_queue_depth", "Jobs waiting for a worker.", function=lambda: JOB_BACKEND.depth()
+))
+METRICS.register(Gauge(
+    "mashup_results_disk_bytes",
+    "Bytes stored under static_results.",
+    function=lambda: results_disk_usage(),
+))
+JOBS = METRICS.register(Counter("mashup_jobs_total", "Finished jobs by outcome.", labels=("outcome",)))
+JOB_FAILURES = METRICS.register(Counter(
+    "mashup_job_failures_total", "Failed jobs by cause.", labels=("cause",)
+))
+DOWNLOAD_SKIPS = METRICS.register(Counter(
+    "mashup_download_skips_total", "Videos skipped during download by cause.", labels=("cause",)
+))
+THROTTLED = METRICS.register(Counter(
+    "mashup_throttled_total", "YouTube responses that throttled a download.", labels=("status",)
+))
+EMAILS = METRICS.register(Counter(
+    "mashup_email_attempts_total", "Email delivery attempts by outcome.", labels=("outcome",)
+))
+
+RESULTS_USAGE_TTL = 30
+_results_usage = {"bytes": 0, "at": None}
+
+
+def results_disk_usage() -> int:
+    """Bytes under static_results, recomputed at most every 30 seconds."""
+    now = time.monotonic()
+    if _results_usage["at"] is None or now - _results_usage["at"] > RESULTS_USAGE_TTL:
+        total = 0
+        for path in STATIC_RESULTS_DIR.rglob("*"):
+            try:
+                if path.is_file():
+                    total += path.stat().st_size
+            except OSError:
+                pass
+        _results_usage.update(bytes=total, at=now)
+    return _results_usage["bytes"]
+
+
+def observe_span(name, data):
+    """Fold one finished span into the stage metrics."""
+    outcome = data.get("outcome", "ok")
+    if data.get("seconds") is not None:
+        STAGE_SECONDS.observe(data["seconds"], stage=name, outcome=outcome)
+    if name == "download":
+        if data.get("bytes"):
+            DOWNLOAD_BYTES.observe(data["bytes"])
+        if outcome == "skipped":
+            DOWNLOAD_SKIPS.inc(cause=data.get("cause", "error"))
+        for status in (403, 429):
+            if data.get(f"throttled_{status}"):
+                THROTTLED.inc(data[f"throttled_{status}"], status=str(status))
+    elif name == "total" and data.get("clips"):
+        JOB_CLIPS.observe(data["clips"])
+
+
+def emit_span(name, seconds, **fields):
+    fields["seconds"] = round(seconds, 3)
+    fields.setdefault("outcome", "ok")
+    print(f"[SPAN] {json.dumps({'span': name, **fields}, default=str)}")
+    observe_span(name, fields)
+
+
+@contextmanager
+def stage_span(name, **data):
+    """Time an app-side stage the way the pipeline times its own."""
+    fields = dict(data)
+    started = time.monotonic()
+    try:
+        yield fields
+    except BaseException:
+        fields["outcome"] = "error"
+        raise
+    finally:
+        emit_span(name, time.monotonic() - started, **fields)
+
+
+def failure_cause(message: str) -> str:
+    """Bucket a job's error message into a low-cardinality metric label."""
+    text = message.lower()
+    if "timed out" in text:
+        return "timeout"
+    if "blocked" in text or "403" in text or "429" in text:
+        return "throttled"
+    if "no videos found" in text or "could not download" in text:
+        return "no_videos"
+    if "youtube api" in text or "youtube_api_key" in text:
+        return "search"
+    if "ffmpeg" in text or "not created" in text:
+        return "encode"
+    return "other"
+
+
+def run_job(file_id, payload):
+    process_mashup_request(
+        payload["singer_name"],
+        payload["number_of_videos"],
+        payload["audio_duration"],
+        payload["email"],
+        file_id,
+        payload["mix"],
+    )
+
+
+# Fixed worker pool with a bounded FIFO queue; POSTs beyond capacity are
+# turned away instead of starting yet another concurrent pipeline.
+# Identical (singer, count, duration) requests share one running job.
+JOB_BACKEND = create_job_backend(
+    JOB_BACKEND_KIND,
+    run_job,
+    workers=int(os.getenv("MASHUP_WORKERS", "2")),
+    max_queued=int(os.getenv("MASHUP_QUEUE_SIZE", "20")),
+    db_path=Path(os.getenv("MASHUP_QUEUE_DB") or STATE_DIR / "queue.sqlite3"),
+    redis_url=REDIS_URL,
+)
+JOB_WORKER = None
+
+
+def lose_job(file_id):
+    """Fail a job whose worker stopped heartbeating (crashed or was killed)."""
+    JOB_BACKEND.discard(file_id)
+    update_status(file_id, "Failed", "The worker running this job stopped. Please resubmit.")
+    JOB_FAILURES.inc(cause="worker_lost")
+
+
+def start_job_worker(threads):
+    """Run jobs from the shared backend on ``threads`` threads of this process."""
+    global JOB_WORKER
+    JOB_WORKER = JobWorker(
+        JOB_BACKEND,
+        run_job,
+        threads=threads,
+        on_lost=lose_job,
+        stale_after=float(os.getenv("MASHUP_JOB_STALE_AFTER", "120")),
+    )
+    JOB_WORKER.start()
+    return JOB_WORKER
+
+
+DEFAULT_DRAIN_TIMEOUT = 25
+
+
+def drain_jobs() -> None:
+    """Let queued and running jobs finish before the worker process exits.
+
+    The default stays under gunicorn's 30 s ``--graceful-timeout``, after
+    which the worker is killed mid-drain; raise both together.
+    """
+    timeout = float(os.getenv("MASHUP_DRAIN_TIMEOUT") or DEFAULT_DRAIN_TIMEOUT)
+    if JOB_WORKER is not None:
+        JOB_WORKER.stop(timeout=timeout)
+    for file_id in JOB_BACKEND.shutdown(timeout=timeout):
+        JOB_BACKEND.discard(file_id)
+        update_status(file_id, "Failed", "Server restarted before this job could start. Please resubmit.")
+
+
+atexit.register(drain_jobs)
+
+
+def expire_result(file_id: str) -> None:
+    update_status(file_id, "Failed", "This mashup has expired. Please submit the request again.")
+
+
+# Finished mashups are reused for identical requests until evicted by the
+# byte quota (least recently used first) or by age.
+RESULTS_MAX_BYTES = int(os.getenv("MASHUP_RESULTS_MAX_BYTES", str(5 * 1024 ** 3)))
+RESULTS_MAX_AGE = float(os.getenv("MASHUP_RESULTS_MAX_AGE", str(7 * 24 * 3600)))
+if JOB_BACKEND_KIND == "redis":
+    RESULT_CACHE = RedisResultCache(
+        root=STATIC_RESULTS_DIR,
+        client=STATUS_STORE.client,
+        max_bytes=RESULTS_MAX_BYTES,
+        max_age=RESULTS_MAX_AGE,
+        on_evict=expire_result,
+    )
+else:
+    RESULT_CACHE = ResultCache(
+        root=STATIC_RESULTS_DIR,
+        db_path=Path(os.getenv("MASHUP_RESULTS_DB") or STATE_DIR / "results.sqlite3"),
+        max_bytes=RESULTS_MAX_BYTES,
+        max_age=RESULTS_MAX_AGE,
+        on_evict=expire_result,
+    )
+JANITOR = Janitor(
+    RESULT_CACHE,
+    interval=float(os.getenv("MASHUP_JANITOR_INTERVAL", "600")),
+    temp_max_age=float(os.getenv("MASHUP_TEMP_MAX_AGE", str(2 * 3600))),
+    is_active=lambda file_id: JOB_BACKEND.position(file_id) is not None,
+)
+
+
+def record_email_attempt(outcome, seconds):
+    EMAILS.inc(outcome=outcome)
+    emit_span("email", seconds, outcome=outcome)
+
+
+# Emails are delivered by a background worker from a persistent queue, over
+# one reused SMTP connection, with exponential-backoff retries.
+OUTBOX = Outbox(
+    db_path=Path(os.getenv("MASHUP_OUTBOX_DB") or STATE_DIR / "outbox.sqlite3"),
+    spool_dir=STATE_DIR / "outbox",
+    settings=SmtpSettings.from_env(),
+    max_attempts=int(os.getenv("MASHUP_EMAIL_MAX_ATTEMPTS", "5")),
+    backoff_base=float(os.getenv("MASHUP_EMAIL_BACKOFF", "30")),
+    on_attempt=record_email_attempt,
+    lease_seconds=float(os.getenv("MASHUP_EMAIL_LEASE", "600")),
+    # Each host delivers from its own outbox; with redis the status of every
+    # message is also recorded there so any web host can report it.
+    on_status=STATUS_STORE.record_delivery if JOB_BACKEND_KIND == "redis" else None,
+)
+
+
+def delivery_status(file_id):
+    if JOB_BACKEND_KIND == "redis":
+        return STATUS_STORE.delivery_status(file_id)
+    return OUTBOX.delivery_status(file_id)
+
+
+def start_services(run_jobs: bool) -> None:
+    """Start the background services this process's role needs.
+
+    Every process delivers the emails it queues (cache hits are queued by
+    the web tier). Only processes that run jobs warm the engine and sweep
+    the results and temp dirs those jobs leave behind.
+    """
+    OUTBOX.start()
+    atexit.register(OUTBOX.stop)
+    if run_jobs:
+        if IN_PROCESS_ENGINE:
+            threading.Thread(target=warm_engine, daemon=True).start()
+        JANITOR.start()
 
-def process_mashup_request(singer_name, number_of_videos, audio_duration, email, file_id):
+
+def queue_mashup_email(email, singer_name, number_of_videos, audio_duration, zip_path, file_id):
+    subject, body = mashup_email(singer_name, number_of_videos, audio_duration)
+    OUTBOX.enqueue(email, subject, body, attachment_path=zip_path, job_id=file_id)
+
+def process_mashup_request(singer_name, number_of_videos, audio_duration, email, file_id, mix=None):
     """Background task to run mashup and email result."""
+    mix = mix or {"crossfade": 0.0, "normalize": False}
+    job_started = time.monotonic()
+    job = STATUS_STORE.get(file_id)
+    if job is not None:
+        emit_span("queue_wait", max(0.0, time.time() - job["created_at"]))
+    job_span = {"videos": number_of_videos, "outcome": "failed"}
     temp_dir = Path(tempfile.mkdtemp(prefix="mashup_web_"))
     update_status(file_id, "Processing", "Starting download and processing...")
     
     try:
         print(f"Processing request for {email} / {singer_name}")
         
-        # We generate a .mp4 for the preview
+        # One audio encode yields both the emailed MP3 and the .mp4 preview
+        audio_file = temp_dir / f"{Path(file_id).stem}.mp3"
         output_file = temp_dir / file_id
         
-        run_cli_mashup(singer_name, number_of_videos, audio_duration, output_file, file_id)
+        runner = run_engine_mashup if IN_PROCESS_ENGINE else run_cli_mashup
+        runner(
+            singer_name,
+            number_of_videos,
+            audio_duration,
+            audio_file,
+            file_id,
+            video_output=output_file,
+            stream_dir=stream_dir_for(file_id),
+            crossfade=mix["crossfade"],
+            normalize=mix["normalize"],
+        )
         
-        if output_file.exists():
-            update_status(file_id, "Processing", "Creating zip and sending email...")
-            # 1. Create ZIP for email
-            zip_file = create_zip_file(output_file)
-            send_email_with_attachment(
-                receiver_email=email,
-                singer_name=singer_name,
-                number_of_videos=number_of_videos,
-                audio_duration=audio_duration,
-                attachment_path=zip_file,
-            )
+        if output_file.exists() and audio_file.exists():
+            update_status(file_id, "Processing", "Creating zip...")
+            # 1. Create ZIP of the MP3 for email
+            with measure_peak_memory(f"packaging {file_id}"), stage_span("zip"):
+                if EMAIL_BUNDLE:
+                    zip_file = create_zip_file(
+                        audio_file,
+                        extra_files=[output_file],
+                        manifest={
+                            "singer": singer_name,
+                            "number_of_videos": number_of_videos,
+                            "audio_duration": audio_duration,
+                            "crossfade": mix["crossfade"],
+                            "normalize": mix["normalize"],
+                            "files": [audio_file.name, output_file.name],
+                            "created_at": int(time.time()),
+                        },
+                    )
+                else:
+                    zip_file = create_zip_file(audio_file)
             
-            # 2. Move MP4 to static folder for preview
+            # 2. Move MP4 to static folder for preview and keep the zip next
+            # to it so identical requests can be served from the cache
             shutil.move(str(output_file), str(STATIC_RESULTS_DIR / file_id))
+            cached_zip = STATIC_RESULTS_DIR / zip_file.name
+            shutil.move(str(zip_file), str(cached_zip))
+            RESULT_CACHE.put(
+                request_fingerprint(singer_name, number_of_videos, audio_duration, **mix),
+                file_id,
+                cached_zip,
+            )
             print(f"Video available at {STATIC_RESULTS_DIR / file_id}")
-            update_status(file_id, "Done", "Mashup created and emailed successfully!")
+
+            # 3. The job is done once the artifacts exist; emails to everyone
+            # who submitted this request go through the outbox, whose
+            # delivery status is tracked separately
+            update_status(file_id, "Done", "Mashup created! The email is on its way.")
+            job_span["outcome"] = "done"
+            for recipient in JOB_BACKEND.finish(file_id) or [email]:
+                queue_mashup_email(
+                    recipient, singer_name, number_of_videos, audio_duration, cached_zip, file_id
+                )
             
         else:
              print("Error: Output file was not created by CLI.")
              update_status(file_id, "Failed", "Output file was not created by CLI logic.")
+             JOB_FAILURES.inc(cause="encode")
 
     except Exception as exc:
         print(f"Background processing error: {exc}")
         update_status(file_id, "Failed", str(exc))
+        JOB_FAILURES.inc(cause=failure_cause(str(exc)))
+        shutil.rmtree(stream_dir_for(file_id), ignore_errors=True)
     finally:
+        JOBS.inc(outcome=job_span["outcome"])
+        emit_span("job", time.monotonic() - job_started, **job_span)
+        JOB_BACKEND.discard(file_id)
         shutil.rmtree(temp_dir, ignore_errors=True)
 
 
+# With a shared backend, web workers only enqueue unless asked to also run
+# jobs (handy for a single-host deployment without a worker.py process).
+# worker.py imports this module as role "worker" and starts its own services.
+EMBEDDED_WORKERS = int(os.getenv("MASHUP_EMBEDDED_WORKERS", "0"))
+if os.getenv("MASHUP_PROCESS_ROLE", "web") == "web":
+    start_services(run_jobs=not JOB_BACKEND.shared or EMBEDDED_WORKERS > 0)
+    if JOB_BACKEND.shared and EMBEDDED_WORKERS > 0:
+        start_job_worker(EMBEDDED_WORKERS)
+
+
 @app.route("/result/<filename>")
 def result(filename):
     """Serve the result page with video player and status."""
     if "/" in filename or "\\" in filename:
         return "Invalid filename", 400
     
-    status_file = STATIC_RESULTS_DIR / f"{filename}.txt"
-    current_status = "Processing"
-    details = "Waiting for update..."
+    job = job_view(filename) or {"status": "Processing", "message": "Waiting for update...", "percent": None, "delivery": {}}
+    current_status = job["status"]
+    details = job["message"]
+    delivery_counts = job.get("delivery") or {}
+    delivery = ", ".join(
+        f"{delivery_counts[key]} {key}"
+        for key in ("sent", "pending", "sending", "failed")
+        if delivery_counts.get(key)
+    )
+    delivery = f"Email: {delivery}" if delivery else ""
+    delivering = bool(delivery_counts.get("pending") or delivery_counts.get("sending"))
 
-    if status_file.exists():
-        try:
-            with open(status_file, "r") as f:
-                content = f.read().strip().split("|", 1)
-                current_status = content[0]
-                if len(content) > 1:
-                    details = content[1]
-        except:
-            pass
-            
-    # Auto-refresh meta tag if processing
-    refresh_tag = '<meta http-equiv="refresh" content="5">' if current_status == "Processing" else ""
+    # Without JavaScript the page still falls back to a periodic reload
+    refresh_tag = (
+        '<noscript><meta http-equiv="refresh" content="5"></noscript>'
+        if current_status in ("Processing", "Queued") else ""
+    )
 
     return render_template_string("""
     <!doctype html>
@@ -377,19 +1078,25 @@ def result(filename):
         .Processing { color: #d97706; }
         .Failed { color: #dc2626; }
         .Done { color: #16a34a; }
+        .Queued { color: #64748b; }
         video { width: 100%; border-radius: 8px; margin-top: 20px; box-shadow: 0 4px 12px rgba(0,0,0,0.1); }
         .btn { display: inline-block; margin-top: 20px; padding: 12px 24px; background: #0ea5e9; color: white; text-decoration: none; border-radius: 6px; font-weight: bold; }
         .btn:hover { background: #0284c7; }
         pre { background: #fee2e2; padding: 10px; border-radius: 6px; overflow-x: auto; text-align: left; }
+        .bar { background: #e2e8f0; border-radius: 6px; height: 8px; overflow: hidden; margin: 12px auto; max-width: 400px; }
+        .bar div { background: #0ea5e9; height: 100%; transition: width 0.5s; }
       </style>
     </head>
     <body>
       <div class="container">
         <h1>Mashup Status</h1>
         
-        <div class="status {{ status }}">Status: {{ status }}</div>
-        <p>{{ details }}</p>
+        <div id="status" class="status {{ status }}">Status: {{ status }}</div>
+        <p id="details">{{ details }}</p>
+        <p id="delivery">{{ delivery }}</p>
+        <div id="preview"></div>
 
+        <div id="outcome">
         {% if status == 'Done' %}
             <video controls autoplay>
                 <source src="/download/{{ filename }}" type="video/mp4">
@@ -399,21 +1106,292 @@ def result(filename):
             <p>Something went wrong. Please check the error above.</p>
         {% else %}
             <p>Please wait...</p>
+            <div class="bar"><div id="percent" style="width: {{ percent or 0 }}%"></div></div>
             <div style="margin: 20px auto; border: 4px solid #f3f3f3; border-top: 4px solid #3498db; border-radius: 50%; width: 30px; height: 30px; animation: spin 2s linear infinite;"></div>
             <style>@keyframes spin { 0% { transform: rotate(0deg); } 100% { transform: rotate(360deg); } }</style>
         {% endif %}
+        </div>
 
         <br>
         <a href="/" class="btn">Back to Home</a>
       </div>
+      {% if status in ('Processing', 'Queued') or delivering %}
+      <script>
+        (function () {
+          var jobId = {{ filename|tojson }};
+          var statusEl = document.getElementById("status");
+          var detailsEl = document.getElementById("details");
+          var outcomeEl = document.getElementById("outcome");
+
+          var deliveryEl = document.getElementById("delivery");
+          var previewEl = document.getElementById("preview");
+          var previewAudio = null;
+          var hlsJs = {{ hls_js|tojson }};
+
+          // Plays the growing HLS playlist while the mashup renders; Safari
+          // plays HLS natively, other browsers get hls.js on demand.
+          function startPreview(url) {
+            previewEl.innerHTML = "<p>Preview (still rendering):</p><audio controls></audio>";
+            previewAudio = previewEl.querySelector("audio");
+            if (previewAudio.canPlayType("application/vnd.apple.mpegurl")) {
+              previewAudio.src = url;
+              return;
+            }
+            if (!hlsJs.url) {
+              previewEl.innerHTML = "";
+              previewAudio = null;
+              return;
+            }
+            var script = document.createElement("script");
+            script.src = hlsJs.url;
+            if (hlsJs.integrity) {
+              script.integrity = hlsJs.integrity;
+              script.crossOrigin = "anonymous";
+            }
+            script.onerror = function () {
+              previewEl.innerHTML = "";
+              previewAudio = null;
+            };
+            script.onload = function () {
+              if (!window.Hls || !Hls.isSupported()) {
+                previewEl.innerHTML = "";
+                previewAudio = null;
+                return;
+              }
+              var hls = new Hls({ startPosition: 0 });
+              hls.loadSource(url);
+              hls.attachMedia(previewAudio);
+            };
+            document.head.appendChild(script);
+          }
+
+          function describeDelivery(counts) {
+            var parts = [];
+            ["sent", "pending", "sending", "failed"].forEach(function (key) {
+              if (counts && counts[key]) parts.push(counts[key] + " " + key);
+            });
+            return parts.length ? "Email: " + parts.join(", ") : "";
+          }
+
+          function render(job) {
+            deliveryEl.textContent = describeDelivery(job.delivery);
+            statusEl.className = "status " + job.status;
+            statusEl.textContent = "Status: " + job.status;
+            detailsEl.textContent = job.message || "";
+            var bar = document.getElementById("percent");
+            if (bar && job.percent !== null && job.percent !== undefined) {
+              bar.style.width = job.percent + "%";
+            }
+            if (job.stream && !previewAudio && job.status !== "Done" && job.status !== "Failed") {
+              startPreview(job.stream);
+            }
+            if (job.status === "Done") {
+              if (!outcomeEl.querySelector("video")) {
+                // Someone listening to the preview keeps it; the full video
+                // then waits for them instead of autoplaying over it.
+                var listening = previewAudio && !previewAudio.paused;
+                if (previewAudio && !listening) {
+                  previewEl.innerHTML = "";
+                  previewAudio = null;
+                }
+                outcomeEl.innerHTML = listening
+                  ? '<video controls><source type="video/mp4"></video>'
+                  : '<video controls autoplay><source type="video/mp4"></video>';
+                outcomeEl.querySelector("source").src = "/download/" + encodeURIComponent(jobId);
+                outcomeEl.querySelector("video").load();
+              }
+            } else if (job.status === "Failed") {
+              previewEl.innerHTML = "";
+              outcomeEl.innerHTML = "<p>Something went wrong. Please check the error above.</p>";
+            }
+            var delivering = job.delivery && (job.delivery.pending || job.delivery.sending);
+            return (job.status === "Done" && !delivering) || job.status === "Failed";
+          }
+
+          function poll() {
+            fetch("/api/jobs/" + encodeURIComponent(jobId))
+              .then(function (r) { return r.json(); })
+              .then(function (job) { if (!render(job)) setTimeout(poll, 5000); })
+              .catch(function () { setTimeout(poll, 5000); });
+          }
+
+          if (!window.EventSource) { poll(); return; }
+          var source = new EventSource("/api/jobs/" + encodeURIComponent(jobId) + "/events");
+          source.onmessage = function (event) {
+            if (render(JSON.parse(event.data))) source.close();
+          };
+        })();
+      </script>
+      {% endif %}
     </body>
     </html>
-    """, filename=filename, status=current_status, details=details, refresh_tag=refresh_tag)
+    """, filename=filename, status=current_status, details=details, percent=job.get("percent"), delivery=delivery, delivering=delivering, refresh_tag=refresh_tag, hls_js=hls_js_source())
+
+
+def email_pending(job):
+    delivery = job.get("delivery") or {}
+    return bool(delivery.get("pending") or delivery.get("sending"))
+
+
+@app.route("/api/jobs/<job_id>")
+def job_status_api(job_id):
+    """Return a job's status as JSON; ``?wait=N&version=V`` long-polls for a change."""
+    job = job_view(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    wait = min(request.args.get("wait", 0, type=float), LONG_POLL_MAX_SECONDS)
+    version = request.args.get("version", type=int)
+    if wait > 0 and version is not None and job["status"] not in FINAL_STATUSES:
+        # With every wait slot taken this answers at once, like a plain poll.
+        if WAIT_SLOTS.acquire(blocking=False):
+            try:
+                STATUS_STORE.wait_for_change(job_id, version, wait)
+            finally:
+                WAIT_SLOTS.release()
+            job = job_view(job_id)
+    return jsonify(job)
+
+
+@app.route("/api/jobs/<job_id>/events")
+def job_events(job_id):
+    """Server-sent events stream of status changes for one job.
+
+    When every wait slot is taken the client gets the current status once
+    and a longer ``retry:``, so it reconnects later instead of holding a
+    thread.
+    """
+    if STATUS_STORE.get(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if not WAIT_SLOTS.acquire(blocking=False):
+        body = f"retry: {SSE_BUSY_RETRY_MS}\n\ndata: {json.dumps(job_view(job_id))}\n\n"
+        return Response(body, mimetype="text/event-stream", headers=headers)
 
-@app.route("/download/<path:filename>")
+    def stream():
+        deadline = time.monotonic() + SSE_MAX_SECONDS
+        yield "retry: 2000\n\n"
+        job = job_view(job_id)
+        yield f"data: {json.dumps(job)}\n\n"
+        while job["status"] not in FINAL_STATUSES or email_pending(job):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # Email delivery does not bump the job version, so finished
+            # jobs with mail still pending are re-checked more often.
+            wait = min(remaining, 10 if job["status"] not in FINAL_STATUSES else 3)
+            changed = STATUS_STORE.wait_for_change(job_id, job["version"], wait)
+            latest = job_view(job_id)
+            if changed is None or latest is None:
+                break
+            if any(latest[key] != job[key] for key in ("version", "queue_position", "delivery")):
+                yield f"data: {json.dumps(latest)}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+            job = latest
+
+    try:
+        response = Response(stream_with_context(stream()), mimetype="text/event-stream", headers=headers)
+    except BaseException:
+        WAIT_SLOTS.release()
+        raise
+    # Released when the server closes the response, even if the client
+    # disconnected before the stream started.
+    response.call_on_close(WAIT_SLOTS.release)
+    return response
+
+# Only finished artifacts are downloadable; the SQLite files and the email
+# spool that share static_results are not.
+DOWNLOADABLE_SUFFIXES = {".mp4", ".zip"}
+ARTIFACT_MAX_AGE = 365 * 24 * 3600
+_etag_cache = {}
+_etag_lock = threading.Lock()
+
+
+def artifact_etag(path: Path) -> str:
+    """Content hash of an artifact, computed once per (path, size, mtime)."""
+    stat = path.stat()
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    with _etag_lock:
+        etag = _etag_cache.get(key)
+    if etag is None:
+        digest = hashlib.sha256()
+        with path.open("rb") as handle:
+            for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+                digest.update(chunk)
+        etag = digest.hexdigest()[:32]
+        with _etag_lock:
+            if len(_etag_cache) > 1024:
+                _etag_cache.clear()
+            _etag_cache[key] = etag
+    return etag
+
+
+@app.route("/download/<filename>")
 def download_file(filename):
-    """Serve the generated video file."""
-    return send_from_directory(STATIC_RESULTS_DIR, filename)
+    """Serve a generated artifact with range support and long-lived caching.
+
+    Artifacts are immutable once their file_id exists, so responses carry a
+    strong content ETag and ``Cache-Control: immutable``; Werkzeug's
+    conditional handling answers Range (206/416), If-Range and
+    If-None-Match (304) requests.
+    """
+    path = STATIC_RESULTS_DIR / filename
+    if (
+        "/" in filename
+        or "\\" in filename
+        or path.suffix.lower() not in DOWNLOADABLE_SUFFIXES
+        or not path.is_file()
+    ):
+        return "File not found", 404
+    response = send_from_directory(
+        STATIC_RESULTS_DIR,
+        filename,
+        conditional=True,
+        etag=artifact_etag(path),
+        max_age=ARTIFACT_MAX_AGE,
+    )
+    response.headers["Cache-Control"] = f"public, max-age={ARTIFACT_MAX_AGE}, immutable"
+    response.headers["Accept-Ranges"] = "bytes"
+    return response
+
+
+STREAM_MIMETYPES = {".m3u8": "application/vnd.apple.mpegurl", ".ts": "video/mp2t"}
+
+
+@app.route("/stream/<job_stem>/<name>")
+def stream_file(job_stem, name):
+    """Serve the growing HLS preview of a job.
+
+    The playlist changes after every clip and must be revalidated; segments
+    are written once and cached like other artifacts.
+    """
+    suffix = Path(name).suffix.lower()
+    path = STREAMS_DIR / job_stem / name
+    if (
+        any(sep in job_stem + name for sep in ("/", "\\"))
+        or job_stem.startswith(".")
+        or name.startswith(".")
+        or suffix not in STREAM_MIMETYPES
+        or not path.is_file()
+    ):
+        return "File not found", 404
+    response = send_from_directory(
+        STREAMS_DIR / job_stem, name, mimetype=STREAM_MIMETYPES[suffix], conditional=True
+    )
+    if suffix == ".m3u8":
+        response.headers["Cache-Control"] = "no-cache"
+    else:
+        response.headers["Cache-Control"] = f"public, max-age={ARTIFACT_MAX_AGE}, immutable"
+    return response
+
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus scrape endpoint (stage latencies, queue and disk gauges)."""
+    response = Response(METRICS.render(), content_type=METRICS_CONTENT_TYPE)
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
 
 @app.route("/", methods=["GET", "POST"])
 def index():
@@ -423,6 +1401,8 @@ def index():
         "singer_name": "",
         "number_of_videos": "11",
         "audio_duration": "30",
+        "crossfade": "0",
+        "normalize": False,
         "email": "",
     }
 
@@ -431,35 +1411,85 @@ def index():
             "singer_name": request.form.get("singer_name", ""),
             "number_of_videos": request.form.get("number_of_videos", ""),
             "audio_duration": request.form.get("audio_duration", ""),
+            "crossfade": request.form.get("crossfade", ""),
+            "normalize": bool(request.form.get("normalize")),
             "email": request.form.get("email", ""),
         }
         
         try:
-            singer_name, number_of_videos, audio_duration, email = parse_form(request.form)
+            singer_name, number_of_videos, audio_duration, email, mix = parse_form(request.form)
+            # Messages are rendered unescaped (they carry links), so user
+            # input must be escaped before it goes into one
+            shown_singer = escape(singer_name)
             
-            # Generate ID for video
-            file_id = f"{int(time.time())}_{abs(hash(singer_name))}.mp4"
+            # Generate ID for video: a stable digest of the request plus a
+            # random suffix, so identical requests never share an id (the
+            # queue and status store key on it) and ids agree across processes
+            fingerprint = request_fingerprint(singer_name, number_of_videos, audio_duration, **mix)
+            digest = hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:16]
+            file_id = f"{digest}_{uuid.uuid4().hex}.mp4"
+
+            # An identical finished mashup is reused without any download
+            # or encode; only the email is queued
+            cached = RESULT_CACHE.get(fingerprint)
+            if cached is not None:
+                cached_id = cached["file_id"]
+                if STATUS_STORE.get(cached_id) is None:
+                    update_status(cached_id, "Done", "Mashup created and emailed successfully!")
+                message = (
+                    f"A mashup for '{shown_singer}' with these settings is already available. "
+                    f"<br><br>👉 <strong><a href='/result/{cached_id}'>Click here to watch the Video Preview</a></strong>"
+                )
+                queue_mashup_email(
+                    email, singer_name, number_of_videos, audio_duration, cached["zip_path"], cached_id
+                )
+                message += "<br>The zip is on its way to your inbox."
+                return render_template_string(FORM_HTML, message=message, status="info", values=values)
+
+            # A duplicate of an in-flight request joins it instead of
+            # starting its own download and encode
+            file_id, attached = JOB_BACKEND.attach(fingerprint, file_id, email)
+            if attached:
+                message = (
+                    f"An identical mashup for '{shown_singer}' is already being created. "
+                    f"You have been added to it and will receive the same email. "
+                    f"<br><br>👉 <strong><a href='/result/{file_id}'>Click here to watch the Video Preview</a></strong>"
+                )
+                return render_template_string(FORM_HTML, message=message, status="info", values=values)
             
-            # Start background thread
-            thread = threading.Thread(
-                target=process_mashup_request,
-                args=(singer_name, number_of_videos, audio_duration, email, file_id),
-                daemon=True
-            )
-            thread.start()
+            # Hand the job to the worker pool; refuse it if the queue is full
+            update_status(file_id, "Queued", "Waiting for a free worker...")
+            try:
+                position = JOB_BACKEND.submit(
+                    file_id,
+                    {
+                        "singer_name": singer_name,
+                        "number_of_videos": number_of_videos,
+                        "audio_duration": audio_duration,
+                        "email": email,
+                        "mix": mix,
+                    },
+                )
+            except QueueFull:
+                JOB_BACKEND.discard(file_id)
+                update_status(file_id, "Failed", "Server busy; request was not accepted.")
+                message = "The server is busy right now. Please try again in a few minutes."
+                return render_template_string(FORM_HTML, message=message, status="error", values=values), 503
             
             message = (
-                f"Request initiated for singer '{singer_name}'. "
+                f"Request initiated for singer '{shown_singer}'. "
                 f"We are creating a <strong>video preview</strong> and emailing the zip. "
                 f"<br><br>👉 <strong><a href='/result/{file_id}'>Click here to watch the Video Preview</a></strong> "
                 f"(Please wait ~1 minute for generation)."
             )
+            if position > 1:
+                message += f"<br>Your request is number {position} in the queue."
             status = "info"
         except ValueError as exc:
-            message = f"Input Error: {exc}"
+            message = f"Input Error: {escape(str(exc))}"
             status = "error"
         except Exception as exc:
-            message = f"System Error: {exc}"
+            message = f"System Error: {escape(str(exc))}"
             status = "error"
 
     return render_template_string(FORM_HTML, message=message, status=status, values=values)
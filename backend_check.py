@@ -0,0 +1,468 @@
+"""Offline checks for the shared job backends.
+
+Exercises the RESP2 codec in ``redis_client``, admission on every backend
+(``max_queued`` counts jobs left waiting beyond idle workers) and, for the
+sqlite and redis backends, submit (including the cap under concurrent
+submitters), claim, heartbeat, reap, complete, attach/finish and a
+``JobWorker`` that runs jobs and reaps one whose worker died. Redis checks
+run against a small in-process stand-in server unless ``--redis-url``
+points at a real one (a unique key prefix is used, so a shared server is
+safe):
+
+    python backend_check.py
+    python backend_check.py --backends redis --redis-url redis://localhost:6379/0
+
+Exits non-zero if any check fails.
+"""
+import argparse
+import io
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from pathlib import Path
+from typing import Callable, List
+
+from job_backend import JobWorker, LocalJobBackend, RedisJobBackend, SqliteJobBackend
+from job_queue import QueueFull
+from redis_client import RedisClient, RedisError, encode_command, read_reply
+
+BACKENDS = ("sqlite", "redis")
+
+
+class CheckFailed(AssertionError):
+    pass
+
+
+def expect(condition: bool, message: str) -> None:
+    if not condition:
+        raise CheckFailed(message)
+
+
+def wait_until(predicate: Callable[[], bool], timeout: float = 10, interval: float = 0.05) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(interval)
+    return predicate()
+
+
+class FakeRedis:
+    """In-process RESP2 server with the commands the redis backend uses.
+
+    Keys are versioned so ``WATCH``/``MULTI``/``EXEC`` abort like Redis
+    does when a watched key changes; ``EX`` and ``EXPIRE`` are accepted and
+    ignored (checks run far inside the TTLs).
+    """
+
+    def __init__(self) -> None:
+        self.data = {}
+        self.versions = {}
+        self.cond = threading.Condition()
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                fake.serve(self.rfile, self.wfile)
+
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = "redis://127.0.0.1:%d/0" % self.server.server_address[1]
+
+    def start(self) -> "FakeRedis":
+        threading.Thread(target=self.server.serve_forever, name="fake-redis", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def serve(self, rfile, wfile) -> None:
+        watched, queued = {}, None
+        while True:
+            try:
+                args = read_reply(rfile)
+            except EOFError:
+                return
+            name, rest = args[0].upper(), args[1:]
+            with self.cond:
+                if name == "WATCH":
+                    watched.update((key, self.versions.get(key, 0)) for key in rest)
+                    reply = "OK"
+                elif name == "UNWATCH":
+                    watched, reply = {}, "OK"
+                elif name == "MULTI":
+                    queued, reply = [], "OK"
+                elif name == "EXEC":
+                    unchanged = all(self.versions.get(key, 0) == seen for key, seen in watched.items())
+                    reply = [self.run(*command) for command in queued] if unchanged else None
+                    watched, queued = {}, None
+                elif queued is not None:
+                    queued.append((name, rest))
+                    reply = "QUEUED"
+                elif name == "BRPOPLPUSH":
+                    deadline = time.monotonic() + float(rest[2])
+                    reply = self.run("RPOPLPUSH", rest[:2])
+                    while reply is None and time.monotonic() < deadline:
+                        self.cond.wait(deadline - time.monotonic())
+                        reply = self.run("RPOPLPUSH", rest[:2])
+                else:
+                    reply = self.run(name, rest)
+            wfile.write(self.encode(reply))
+
+    def touch(self, key: str) -> None:
+        self.versions[key] = self.versions.get(key, 0) + 1
+        if self.data.get(key) in ([], {}, set()):
+            del self.data[key]
+
+    def run(self, name: str, args: list):
+        data = self.data
+        if name in ("AUTH", "SELECT", "PING"):
+            return "OK"
+        if name == "GET":
+            return data.get(args[0])
+        if name == "SET":
+            data[args[0]] = args[1]
+            self.touch(args[0])
+            return "OK"
+        if name == "DEL":
+            removed = [key for key in args if data.pop(key, None) is not None]
+            for key in removed:
+                self.touch(key)
+            return len(removed)
+        if name == "EXPIRE":
+            return int(args[0] in data)
+        if name == "LPUSH":
+            items = data.setdefault(args[0], [])
+            items[:0] = reversed(args[1:])
+            self.touch(args[0])
+            self.cond.notify_all()
+            return len(items)
+        if name == "LLEN":
+            return len(data.get(args[0], []))
+        if name == "LRANGE":
+            items = data.get(args[0], [])
+            stop = int(args[2])
+            return items[int(args[1]):None if stop == -1 else stop + 1]
+        if name == "LREM":
+            items = data.get(args[0], [])
+            if args[2] not in items:
+                return 0
+            items.remove(args[2])
+            self.touch(args[0])
+            return 1
+        if name == "RPOPLPUSH":
+            if not data.get(args[0]):
+                return None
+            value = data[args[0]].pop()
+            self.touch(args[0])
+            data.setdefault(args[1], []).insert(0, value)
+            self.touch(args[1])
+            return value
+        if name in ("HSET", "HSETNX"):
+            fields = data.setdefault(args[0], {})
+            pairs = list(zip(args[1::2], args[2::2]))
+            if name == "HSETNX" and pairs[0][0] in fields:
+                return 0
+            added = sum(field not in fields for field, _ in pairs)
+            fields.update(pairs)
+            self.touch(args[0])
+            return added
+        if name == "HGET":
+            return data.get(args[0], {}).get(args[1])
+        if name == "HGETALL":
+            return [item for pair in data.get(args[0], {}).items() for item in pair]
+        if name == "HDEL":
+            fields = data.get(args[0], {})
+            removed = sum(fields.pop(field, None) is not None for field in args[1:])
+            if removed:
+                self.touch(args[0])
+            return removed
+        if name == "SADD":
+            members = data.setdefault(args[0], set())
+            added = len(set(args[1:]) - members)
+            members.update(args[1:])
+            self.touch(args[0])
+            return added
+        if name == "SMEMBERS":
+            return sorted(data.get(args[0], ()))
+        return RedisError(f"ERR unknown command '{name}'")
+
+    def encode(self, reply) -> bytes:
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, RedisError):
+            return f"-{reply}\r\n".encode("utf-8")
+        if isinstance(reply, int):
+            return f":{reply}\r\n".encode("ascii")
+        if isinstance(reply, list):
+            return f"*{len(reply)}\r\n".encode("ascii") + b"".join(self.encode(item) for item in reply)
+        if reply in ("OK", "QUEUED"):
+            return f"+{reply}\r\n".encode("ascii")
+        data = str(reply).encode("utf-8")
+        return f"${len(data)}\r\n".encode("ascii") + data + b"\r\n"
+
+
+def check_resp() -> None:
+    expect(
+        encode_command(("SET", "k", 12, b"\x00v")) == b"*4\r\n$3\r\nSET\r\n$1\r\nk\r\n$2\r\n12\r\n$2\r\n\x00v\r\n",
+        "encode_command framing",
+    )
+    expect(encode_command(("SET", "k", "é")).endswith(b"$2\r\n\xc3\xa9\r\n"), "bulk length counts bytes")
+    cases = [
+        (b"+OK\r\n", "OK"),
+        (b":42\r\n", 42),
+        (b"$5\r\nhello\r\n", "hello"),
+        (b"$0\r\n\r\n", ""),
+        (b"$-1\r\n", None),
+        (b"*-1\r\n", None),
+        (b"*3\r\n:1\r\n$1\r\na\r\n*1\r\n$-1\r\n", [1, "a", [None]]),
+        (b"$4\r\na\r\nb\r\n", "a\r\nb"),
+    ]
+    for raw, expected in cases:
+        reply = read_reply(io.BytesIO(raw))
+        expect(reply == expected, f"read_reply({raw!r}) gave {reply!r}")
+    error = read_reply(io.BytesIO(b"-WRONGTYPE bad\r\n"))
+    expect(isinstance(error, RedisError) and str(error) == "WRONGTYPE bad", "error replies are returned, not raised")
+    for truncated in (b"", b"+OK", b"$5\r\nhel"):
+        try:
+            read_reply(io.BytesIO(truncated))
+        except EOFError:
+            continue
+        raise CheckFailed(f"read_reply({truncated!r}) did not raise EOFError")
+    try:
+        read_reply(io.BytesIO(b"?\r\n"))
+    except RedisError:
+        pass
+    else:
+        raise CheckFailed("unknown reply type did not raise RedisError")
+
+
+def check_submit(backend) -> None:
+    expect(backend.depth() == 0 and backend.active() == 0, "backend starts empty")
+    for index in range(1, 4):
+        position = backend.submit(f"job-{index}", {"index": index})
+        expect(position == index, f"submit returned position {position}, expected {index}")
+    expect(backend.position("job-1") == 1 and backend.position("job-3") == 3, "queued positions")
+    expect(backend.position("missing") is None, "unknown job has no position")
+    try:
+        backend.submit("job-4", {"index": 4})
+    except QueueFull:
+        pass
+    else:
+        raise CheckFailed("submit past max_queued did not raise QueueFull")
+    expect(backend.depth() == 3, "rejected job is not left queued")
+
+
+def check_claim(backend) -> None:
+    for index in range(1, 4):
+        backend.submit(f"job-{index}", {"index": index})
+    job = backend.claim("worker-a", timeout=1)
+    expect(job == ("job-1", {"index": 1}), f"claim returned {job!r}, expected the oldest job")
+    expect(backend.position("job-1") == 0, "running job reports position 0")
+    expect(backend.position("job-2") == 1, "positions move up after a claim")
+    expect(backend.depth() == 2 and backend.active() == 1, "depth/active after a claim")
+    backend.complete("job-1")
+    expect(backend.active() == 0 and backend.position("job-1") is None, "complete forgets the job")
+    for expected in ("job-2", "job-3"):
+        job = backend.claim("worker-a", timeout=1)
+        expect(job is not None and job[0] == expected, f"claim returned {job!r}, expected {expected}")
+        backend.complete(expected)
+    started = time.monotonic()
+    expect(backend.claim("worker-a", timeout=1) is None, "claim on an empty queue returns None")
+    expect(time.monotonic() - started < 5, "empty claim respects its timeout")
+
+
+def check_concurrent_submit(backend) -> None:
+    accepted, rejected = [], []
+
+    def submit(index: int) -> None:
+        try:
+            accepted.append(backend.submit(f"burst-{index}", {"index": index}))
+        except QueueFull:
+            rejected.append(index)
+
+    threads = [threading.Thread(target=submit, args=(index,)) for index in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    expect(len(accepted) == 3 and len(rejected) == 17, f"{len(accepted)} of 20 concurrent submits accepted, cap is 3")
+    expect(sorted(accepted) == [1, 2, 3] and backend.depth() == 3, "concurrent submits keep distinct positions")
+    while True:
+        job = backend.claim("worker-a", timeout=1)
+        if job is None:
+            break
+        backend.complete(job[0])
+
+
+def check_reap(backend) -> None:
+    backend.submit("stale", {})
+    backend.submit("live", {})
+    expect(backend.claim("dead-worker", timeout=1)[0] == "stale", "claim stale job")
+    expect(backend.claim("live-worker", timeout=1)[0] == "live", "claim live job")
+    expect(backend.reap(stale_after=60) == [], "fresh heartbeats are not reaped")
+    time.sleep(1.2)
+    backend.heartbeat(["live"])
+    lost = backend.reap(stale_after=1)
+    expect(lost == ["stale"], f"reap returned {lost!r}, expected only the silent job")
+    expect(backend.reap(stale_after=1) == [], "a reaped job is reported once")
+    expect(backend.active() == 1 and backend.position("live") == 0, "live job keeps running")
+    backend.complete("live")
+
+
+def check_attach(backend) -> None:
+    owner, attached = backend.attach("fingerprint", "first", "a@example.com")
+    expect((owner, attached) == ("first", False), f"first attach gave {(owner, attached)!r}")
+    owner, attached = backend.attach("fingerprint", "second", "b@example.com")
+    expect((owner, attached) == ("first", True), f"duplicate attach gave {(owner, attached)!r}")
+    backend.attach("fingerprint", "third", "a@example.com")
+    emails = backend.finish("first")
+    expect(sorted(emails) == ["a@example.com", "b@example.com"], f"finish returned {emails!r}")
+    expect(backend.finish("first") == [], "finish is idempotent")
+    owner, attached = backend.attach("fingerprint", "fourth", "c@example.com")
+    expect((owner, attached) == ("fourth", False), "a finished fingerprint starts a new job")
+    backend.discard("fourth")
+
+
+def expect_full(backend, job_id: str, message: str) -> None:
+    try:
+        backend.submit(job_id, {})
+    except QueueFull:
+        return
+    raise CheckFailed(message)
+
+
+def check_admission(backend) -> None:
+    # Built with max_queued=0: only jobs an idle worker takes at once fit.
+    expect_full(backend, "early", "a job was admitted with no worker registered")
+    backend.register("worker-a", 2, ttl=60)
+    backend.register("worker-gone", 5, ttl=-1)
+    backend.submit("first", {})
+    backend.submit("second", {})
+    expect_full(backend, "third", "a job was admitted beyond the idle workers")
+    expect(backend.claim("worker-a", timeout=1)[0] == "first", "claim first")
+    expect_full(backend, "third", "a job was admitted while the idle worker already had one waiting")
+    backend.complete("first")
+    backend.submit("third", {})
+    backend.unregister("worker-a")
+    expect_full(backend, "fourth", "a job was admitted after the worker unregistered")
+    while True:
+        job = backend.claim("worker-a", timeout=1)
+        if job is None:
+            break
+        backend.complete(job[0])
+
+
+def check_local_admission() -> None:
+    release = threading.Event()
+    started = threading.Semaphore(0)
+
+    def handler(job_id: str, payload: dict) -> None:
+        started.release()
+        release.wait(10)
+
+    backend = LocalJobBackend(handler, workers=2, max_queued=0)
+    try:
+        backend.submit("first", {})
+        backend.submit("second", {})
+        expect_full(backend, "third", "a job was admitted with both workers busy")
+        expect(started.acquire(timeout=5) and started.acquire(timeout=5), "both workers started")
+        expect_full(backend, "third", "a job was admitted with both workers running")
+    finally:
+        release.set()
+        backend.shutdown(timeout=5)
+
+
+def check_worker(backend) -> None:
+    done, lost = [], []
+    backend.submit("orphan", {})
+    expect(backend.claim("crashed-worker", timeout=1)[0] == "orphan", "claim orphan job")
+    for index in range(3):
+        backend.submit(f"run-{index}", {"index": index})
+    worker = JobWorker(
+        backend,
+        lambda job_id, payload: done.append(payload["index"]),
+        threads=2,
+        on_lost=lost.append,
+        heartbeat_interval=0.25,
+        stale_after=1,
+        poll_interval=0.5,
+    )
+    worker.start()
+    try:
+        expect(wait_until(lambda: len(done) == 3), f"worker ran {len(done)} of 3 jobs")
+        expect(wait_until(lambda: lost == ["orphan"]), f"worker reaped {lost!r}, expected the orphan")
+        expect(wait_until(lambda: backend.depth() == 0 and backend.active() == 0), "queue drains")
+    finally:
+        worker.stop(timeout=5)
+    expect(sorted(done) == [0, 1, 2], f"worker ran {sorted(done)!r}")
+
+
+BACKEND_CHECKS = [
+    check_submit,
+    check_admission,
+    check_claim,
+    check_concurrent_submit,
+    check_reap,
+    check_attach,
+    check_worker,
+]
+
+
+def run(name: str, check: Callable[[], None]) -> bool:
+    started = time.monotonic()
+    try:
+        check()
+    except Exception as e:
+        detail = str(e) if isinstance(e, CheckFailed) else traceback.format_exc().rstrip()
+        print(f"FAIL {name}: {detail}", flush=True)
+        return False
+    print(f"ok   {name} ({time.monotonic() - started:.2f}s)", flush=True)
+    return True
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Offline checks for the shared job backends.")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS), help="Backends to check")
+    parser.add_argument("--redis-url", default=None, help="Real Redis server (default: in-process stand-in)")
+    return parser
+
+
+def main(argv: List[str]) -> int:
+    args = build_parser().parse_args(argv)
+    results = [run("resp", check_resp), run("local admission", check_local_admission)]
+    with tempfile.TemporaryDirectory(prefix="backend_check_") as work_dir:
+        for kind in args.backends:
+            fake = None
+            if kind == "sqlite":
+                make = lambda name, max_queued: SqliteJobBackend(
+                    Path(work_dir) / f"{name}.sqlite3", max_queued=max_queued
+                )
+            else:
+                if args.redis_url is None:
+                    fake = FakeRedis().start()
+                client = RedisClient.from_url(args.redis_url or fake.url)
+                prefix = f"backend-check-{uuid.uuid4().hex[:8]}"
+                make = lambda name, max_queued: RedisJobBackend(
+                    client, max_queued=max_queued, prefix=f"{prefix}:{name}"
+                )
+            try:
+                for check in BACKEND_CHECKS:
+                    name = check.__name__[len("check_"):]
+                    backend = make(name, 0 if check is check_admission else 3)
+                    results.append(run(f"{kind} {name}", lambda: check(backend)))
+            finally:
+                if fake is not None:
+                    fake.stop()
+    failed = results.count(False)
+    print(f"{len(results) - failed} passed, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
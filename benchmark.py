@@ -0,0 +1,577 @@
+"""Offline benchmark for the mashup pipeline.
+
+Runs ``102303052.py`` against a local stand-in for YouTube: a fake Data API
+client answering ``search().list`` and ``videos().list`` and a fake ``yt_dlp.YoutubeDL`` that
+"downloads" generated audio fixtures (mixed codecs, sample rates, channel
+counts and lengths), optionally throttled to a given latency and bandwidth.
+Every (NumberOfVideos, AudioDuration) scenario runs in a fresh interpreter so
+peak RSS is per scenario, and per-stage wall time, CPU (own and ffmpeg
+children), peak RSS and bytes written go to a JSON file that can be compared
+between commits:
+
+    python benchmark.py --videos 11 25 50 --durations 21 30 --output bench.json
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+try:
+    import resource
+except ImportError:  # Windows: CPU and child RSS are not reported
+    resource = None
+
+BASE_DIR = Path(__file__).resolve().parent
+RESULT_PREFIX = "BENCH_RESULT "
+STAGES = ("download", "merge", "pipeline", "web")
+BENCH_SINGER = "Benchmark Singer"
+
+# (extension, encoder, sample rate, channels): the spread of containers and
+# layouts real downloads arrive in.
+FIXTURE_FORMATS = (
+    ("m4a", "aac", 44100, 2),
+    ("webm", "libopus", 48000, 2),
+    ("mp3", "libmp3lame", 22050, 1),
+    ("m4a", "aac", 48000, 1),
+)
+
+
+# Ways a catalog entry can be unusable; see ``--unusable``.
+UNUSABLE_KINDS = ("live", "age_restricted", "long_loop")
+
+
+def fake_video_id(index: int) -> str:
+    return f"bench{index:06d}"
+
+
+def fake_problem(video_id: str, fraction: float) -> Optional[str]:
+    """Deterministically mark about ``fraction`` of the catalog as unusable."""
+    if fraction <= 0:
+        return None
+    digest = int(hashlib.md5(f"problem:{video_id}".encode("utf-8")).hexdigest(), 16)
+    if digest % 1000 >= fraction * 1000:
+        return None
+    return UNUSABLE_KINDS[(digest // 1000) % len(UNUSABLE_KINDS)]
+
+
+class FixtureCorpus:
+    """Generated audio files served by the fake downloader, built once and reused.
+
+    Each format comes in three lengths (just over the clip length, twice it
+    and four times it) so trimming cost varies the way real videos do.
+    """
+
+    def __init__(self, root: Path, ffmpeg: str, min_seconds: int) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.ffmpeg = ffmpeg
+        lengths = (min_seconds + 5, min_seconds * 2, min_seconds * 4)
+        self.fixtures = [
+            self._build(fmt, seconds, index)
+            for index, (fmt, seconds) in enumerate(itertools.product(FIXTURE_FORMATS, lengths))
+        ]
+
+    def _build(self, fmt: tuple, seconds: int, index: int) -> Path:
+        ext, codec, rate, channels = fmt
+        path = self.root / f"fixture_{codec}_{rate}_{channels}ch_{seconds}s.{ext}"
+        if path.exists():
+            return path
+        tmp_path = self.root / f".tmp-{os.getpid()}-{path.name}"
+        frequency = 220 + 110 * (index % 7)
+        command = [
+            self.ffmpeg, "-y", "-v", "error",
+            "-f", "lavfi", "-i", f"sine=frequency={frequency}:sample_rate={rate}:duration={seconds}",
+            "-ac", str(channels), "-c:a", codec, "-b:a", "128k",
+            str(tmp_path),
+        ]
+        subprocess.run(command, check=True, capture_output=True)
+        os.replace(tmp_path, path)
+        return path
+
+    def pick(self, video_id: str) -> Path:
+        digest = int(hashlib.md5(video_id.encode("utf-8")).hexdigest(), 16)
+        return self.fixtures[digest % len(self.fixtures)]
+
+
+class FakeRequest:
+    def __init__(self, response: dict) -> None:
+        self.response = response
+
+    def execute(self) -> dict:
+        return self.response
+
+
+class FakeYouTubeAPI:
+    """Stand-in for the ``youtube`` v3 client serving ``search().list()``.
+
+    Results page through ``nextPageToken`` over a catalog of ``catalog_size``
+    fake video ids, with ``latency`` seconds per call. About ``unusable`` of
+    the catalog are live streams, age-restricted videos or 10-hour loops.
+    """
+
+    def __init__(self, catalog_size: int, latency: float = 0.0, unusable: float = 0.0) -> None:
+        self.catalog_size = catalog_size
+        self.latency = latency
+        self.unusable = unusable
+        self.calls = 0
+
+    def search(self) -> "FakeYouTubeAPI":
+        return self
+
+    def videos(self) -> "FakeVideos":
+        return FakeVideos(self)
+
+    def list(self, **params) -> FakeRequest:
+        self.calls += 1
+        time.sleep(self.latency)
+        start = int(params.get("pageToken") or 0)
+        end = min(self.catalog_size, start + min(50, int(params.get("maxResults", 5))))
+        response = {
+            "items": [
+                {
+                    "id": {"kind": "youtube#video", "videoId": fake_video_id(index)},
+                    "snippet": {
+                        "title": f"{params.get('q', '')} fixture {index}",
+                        "liveBroadcastContent": (
+                            "live"
+                            if fake_problem(fake_video_id(index), self.unusable) == "live"
+                            else "none"
+                        ),
+                    },
+                }
+                for index in range(start, end)
+            ]
+        }
+        if end < self.catalog_size:
+            response["nextPageToken"] = str(end)
+        return FakeRequest(response)
+
+
+class FakeVideos:
+    """``videos().list(part="contentDetails,status")`` over the fake catalog."""
+
+    def __init__(self, api: FakeYouTubeAPI) -> None:
+        self.api = api
+
+    def list(self, **params) -> FakeRequest:
+        self.api.calls += 1
+        time.sleep(self.api.latency)
+        if "id" in params and "maxResults" in params:
+            # The real API answers 400 incompatibleParameters
+            raise RuntimeError("videos.list: maxResults cannot be used with id")
+        items = []
+        for video_id in params.get("id", "").split(",")[:50]:
+            problem = fake_problem(video_id, self.api.unusable)
+            rating = {"ytRating": "ytAgeRestricted"} if problem == "age_restricted" else {}
+            items.append(
+                {
+                    "id": video_id,
+                    "contentDetails": {
+                        "duration": {"live": "P0D", "long_loop": "PT10H"}.get(problem, "PT3M30S"),
+                        "contentRating": rating,
+                    },
+                    "status": {"uploadStatus": "processed", "privacyStatus": "public"},
+                }
+            )
+        return FakeRequest({"items": items})
+
+
+class FakeYoutubeDL:
+    """Stand-in for ``yt_dlp.YoutubeDL`` that copies a fixture per video id.
+
+    ``latency`` is charged per metadata request and ``bandwidth`` (bytes per
+    second, 0 for unlimited) per download. Range requests are not emulated:
+    every fetch serves the whole fixture. Live and age-restricted catalog
+    entries fail at extraction, the way yt_dlp reports them.
+    """
+
+    corpus: Optional[FixtureCorpus] = None
+    latency = 0.0
+    bandwidth = 0.0
+    unusable = 0.0
+
+    def __init__(self, params: Optional[dict] = None) -> None:
+        self.params = dict(params or {})
+
+    def extract_info(self, url: str, download: bool = False) -> dict:
+        time.sleep(self.latency)
+        video_id = parse_qs(urlparse(url).query)["v"][0]
+        problem = fake_problem(video_id, self.unusable)
+        if problem == "live":
+            raise RuntimeError(f"ERROR: [youtube] {video_id}: This live event will begin in a few moments.")
+        if problem == "age_restricted":
+            raise RuntimeError(f"ERROR: [youtube] {video_id}: Sign in to confirm your age.")
+        fixture = self.corpus.pick(video_id)
+        info = {
+            "id": video_id,
+            "title": f"Benchmark fixture {video_id}",
+            "ext": fixture.suffix[1:],
+            "protocol": "https",
+            "url": f"https://media.fixtures.invalid/{video_id}",
+            "filesize": fixture.stat().st_size,
+            "fixture": str(fixture),
+        }
+        return self.process_ie_result(info, download=True) if download else info
+
+    def process_ie_result(self, info: dict, download: bool = True) -> dict:
+        fixture = Path(info["fixture"])
+        target = Path(self.params["outtmpl"] % info)
+        size = fixture.stat().st_size
+        if self.bandwidth:
+            time.sleep(size / self.bandwidth)
+        shutil.copyfile(fixture, target)
+        for hook in self.params.get("progress_hooks", []):
+            hook({"status": "finished", "info_dict": info, "downloaded_bytes": size, "total_bytes": size})
+        return dict(info, requested_downloads=[{"filepath": str(target)}])
+
+    def close(self) -> None:
+        pass
+
+
+def install_fakes(
+    corpus: FixtureCorpus, catalog_size: int, latency: float, bandwidth: float, unusable: float = 0.0
+) -> None:
+    """Register the fake ``googleapiclient`` and ``yt_dlp`` modules.
+
+    The CLI imports both lazily inside its functions, so installing them in
+    ``sys.modules`` before a run is enough.
+    """
+    FakeYoutubeDL.corpus = corpus
+    FakeYoutubeDL.latency = latency
+    FakeYoutubeDL.bandwidth = bandwidth
+    FakeYoutubeDL.unusable = unusable
+    api = FakeYouTubeAPI(catalog_size, latency, unusable)
+
+    yt_dlp = types.ModuleType("yt_dlp")
+    yt_dlp.YoutubeDL = FakeYoutubeDL
+    utils = types.ModuleType("yt_dlp.utils")
+    utils.download_range_func = lambda chapters, ranges: ("ranges", ranges)
+    yt_dlp.utils = utils
+
+    googleapiclient = types.ModuleType("googleapiclient")
+    discovery = types.ModuleType("googleapiclient.discovery")
+    discovery.build = lambda service, version, developerKey=None, **kwargs: api
+    googleapiclient.discovery = discovery
+
+    sys.modules.update(
+        {
+            "yt_dlp": yt_dlp,
+            "yt_dlp.utils": utils,
+            "googleapiclient": googleapiclient,
+            "googleapiclient.discovery": discovery,
+        }
+    )
+
+
+def current_rss() -> int:
+    try:
+        with open("/proc/self/statm") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def io_counters() -> Dict[str, int]:
+    """``/proc/self/io`` counters; reaped children (ffmpeg) are included."""
+    counters = {}
+    try:
+        with open("/proc/self/io") as handle:
+            for line in handle:
+                key, _, value = line.partition(":")
+                counters[key.strip()] = int(value)
+    except (OSError, ValueError):
+        pass
+    return counters
+
+
+def cpu_times() -> tuple:
+    if resource is None:
+        return 0.0, 0.0, 0
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime, children.ru_utime + children.ru_stime, children.ru_maxrss
+
+
+@contextmanager
+def measure(stages: dict, name: str, sample_interval: float = 0.02):
+    """Record one stage's wall/CPU/RSS/IO into ``stages[name]``.
+
+    The stage body may add its own keys to the yielded dict. An exception is
+    recorded as ``error`` instead of propagating, so later stages still run.
+    """
+    record = {}
+    peak = [current_rss()]
+    done = threading.Event()
+
+    def sample() -> None:
+        while not done.wait(sample_interval):
+            peak[0] = max(peak[0], current_rss())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    io_before = io_counters()
+    cpu_before, children_before, _ = cpu_times()
+    started = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record["error"] = str(e)[-300:]
+    finally:
+        wall = time.perf_counter() - started
+        done.set()
+        sampler.join()
+        cpu_after, children_after, children_max_rss = cpu_times()
+        io_after = io_counters()
+        record.update(
+            wall_s=round(wall, 3),
+            cpu_s=round(cpu_after - cpu_before, 3),
+            children_cpu_s=round(children_after - children_before, 3),
+            peak_rss_mb=round(max(peak[0], current_rss()) / 1048576, 1),
+            # ru_maxrss is in KiB on Linux and is the largest child so far
+            # in this scenario, not just this stage.
+            children_max_rss_mb=round(children_max_rss / 1024, 1),
+        )
+        for key in ("write_bytes", "wchar"):
+            if key in io_after and key in io_before:
+                record[key] = io_after[key] - io_before[key]
+        stages[name] = record
+
+
+def file_bytes(*paths: Path) -> int:
+    return sum(path.stat().st_size for path in paths if path.exists())
+
+
+def run_scenario(spec: dict) -> dict:
+    """Run the selected stages for one scenario in this process."""
+    work_dir = Path(tempfile.mkdtemp(prefix="mashup_bench_"))
+    os.environ.update(
+        YOUTUBE_API_KEY="benchmark",
+        MASHUP_CACHE_DIR=str(work_dir / "cache"),
+        MASHUP_CACHE_ENABLED="true" if spec["cache"] else "false",
+        MASHUP_SEARCH_TTL="0",
+    )
+    sys.path.insert(0, str(BASE_DIR))
+    from mashup_engine import load_cli_module
+
+    cli = load_cli_module()
+    cli.configure_ffmpeg()
+    corpus = FixtureCorpus(Path(spec["fixtures"]), cli.ffmpeg_binary(), spec["duration"])
+    install_fakes(corpus, spec["catalog"], spec["latency"], spec["bandwidth"], spec.get("unusable", 0.0))
+
+    videos, duration = spec["videos"], spec["duration"]
+    target_level = cli.DEFAULT_TARGET_LEVEL if spec["normalize"] else None
+    stages = {}
+    try:
+        downloads = []
+        if {"download", "merge"} & set(spec["stages"]):
+            with measure(stages, "download") as record:
+                stats = {}
+                (work_dir / "downloads").mkdir()
+                downloads = cli.download_videos(
+                    BENCH_SINGER,
+                    videos,
+                    work_dir / "downloads",
+                    audio_duration=duration,
+                    stats=stats,
+                    cache=cli.ClipCache.from_env(),
+                )
+                record.update(files=len(downloads), input_bytes=file_bytes(*downloads), stats=stats)
+
+        if "merge" in spec["stages"] and downloads:
+            with measure(stages, "merge") as record:
+                output = work_dir / "merge.mp3"
+                cli.create_merged_video(downloads, duration, output, engine=spec["engine"])
+                record["output_bytes"] = file_bytes(output)
+
+        if "pipeline" in spec["stages"]:
+            with measure(stages, "pipeline") as record:
+                output = work_dir / "pipeline.mp3"
+                cli.run_mashup(
+                    BENCH_SINGER,
+                    videos,
+                    duration,
+                    output,
+                    engine=spec["engine"],
+                    crossfade=spec["crossfade"],
+                    target_level=target_level,
+                )
+                record["output_bytes"] = file_bytes(output)
+
+        if "web" in spec["stages"]:
+            run_web_stage(spec, work_dir, stages)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    scenario = {key: value for key, value in spec.items() if key not in {"fixtures", "stages"}}
+    return {"scenario": scenario, "stages": stages}
+
+
+def run_web_stage(spec: dict, work_dir: Path, stages: dict) -> None:
+    """Time ``process_mashup_request`` (MP3, MP4 preview, zip) minus email delivery."""
+    web_dir = work_dir / "web"
+    web_dir.mkdir()
+    # static_results and the SQLite stores are relative to the working dir.
+    os.chdir(web_dir)
+    try:
+        import app as web
+    except Exception as e:
+        stages["web"] = {"skipped": f"web app unavailable: {e}"}
+        return
+    web.queue_mashup_email = lambda *args, **kwargs: None
+    file_id = f"bench_{spec['videos']}_{spec['duration']}.mp4"
+    with measure(stages, "web") as record:
+        web.process_mashup_request(
+            BENCH_SINGER,
+            spec["videos"],
+            spec["duration"],
+            "benchmark@example.com",
+            file_id,
+            {"crossfade": spec["crossfade"], "normalize": spec["normalize"]},
+        )
+        job = web.STATUS_STORE.get(file_id) or {}
+        record["status"] = job.get("status")
+        if job.get("status") != "Done":
+            record["error"] = job.get("message")
+        results = web.STATIC_RESULTS_DIR
+        record["output_bytes"] = file_bytes(results / file_id, *results.glob("*.zip"))
+    web.JANITOR.stop()
+    web.OUTBOX.stop()
+
+
+def git_revision() -> Optional[str]:
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=BASE_DIR, capture_output=True, text=True,
+        ).stdout.strip()
+        return f"{revision}-dirty" if dirty else revision
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> dict:
+    return {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "settings": {key: value for key, value in sorted(os.environ.items()) if key.startswith("MASHUP_")},
+    }
+
+
+def run_child(spec: dict, timeout: float) -> dict:
+    try:
+        completed = subprocess.run(
+            [sys.executable, str(Path(__file__).resolve()), "--child", json.dumps(spec)],
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+            cwd=BASE_DIR,
+        )
+    except subprocess.TimeoutExpired:
+        return {"scenario": spec, "error": f"timed out after {timeout:.0f}s"}
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    tail = (completed.stderr or completed.stdout).strip()[-500:]
+    return {"scenario": spec, "error": f"exit code {completed.returncode}: {tail}"}
+
+
+def summarize(result: dict) -> str:
+    scenario = result["scenario"]
+    label = f"videos={scenario['videos']} duration={scenario['duration']}"
+    if "error" in result:
+        return f"{label}: ERROR {result['error']}"
+    parts = []
+    for name, stage in result["stages"].items():
+        if "skipped" in stage:
+            parts.append(f"{name}=skipped")
+            continue
+        text = (
+            f"{name}={stage['wall_s']:.2f}s cpu={stage['cpu_s'] + stage['children_cpu_s']:.2f}s "
+            f"rss={stage['peak_rss_mb']}MB"
+        )
+        if "error" in stage:
+            text += " (error)"
+        parts.append(text)
+    return f"{label}: " + ", ".join(parts)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Offline benchmark for the mashup pipeline.")
+    parser.add_argument("--videos", type=int, nargs="+", default=[11, 25], help="NumberOfVideos values to sweep")
+    parser.add_argument("--durations", type=int, nargs="+", default=[21, 30], help="AudioDuration values to sweep")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES), help="Stages to measure")
+    parser.add_argument("--engine", choices=("ffmpeg", "moviepy"), default="ffmpeg")
+    parser.add_argument("--crossfade", type=float, default=0.0, help="Crossfade seconds for pipeline/web runs")
+    parser.add_argument("--normalize", action="store_true", help="Normalize loudness in pipeline/web runs")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per scenario")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per fake API/metadata call")
+    parser.add_argument("--bandwidth", type=float, default=0.0, help="Fake download speed in MB/s (0 = unlimited)")
+    parser.add_argument("--catalog", type=int, default=500, help="Videos the fake search can return")
+    parser.add_argument(
+        "--unusable", type=float, default=0.0,
+        help="Fraction of the catalog that is live, age-restricted or a 10-hour loop",
+    )
+    parser.add_argument("--cache", action="store_true", help="Enable the clip cache (cold per scenario)")
+    parser.add_argument("--fixtures", default=None, help="Fixture directory (reused between runs)")
+    parser.add_argument("--timeout", type=float, default=1800, help="Seconds allowed per scenario")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON results file")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv: List[str]) -> int:
+    args = build_parser().parse_args(argv)
+    if args.child:
+        result = run_scenario(json.loads(args.child))
+        print(RESULT_PREFIX + json.dumps(result), flush=True)
+        return 0
+
+    fixtures = Path(args.fixtures or Path(tempfile.gettempdir()) / "mashup_bench_fixtures").resolve()
+    results = []
+    for videos, duration in itertools.product(args.videos, args.durations):
+        for run in range(1, args.repeat + 1):
+            spec = {
+                "videos": videos,
+                "duration": duration,
+                "run": run,
+                "stages": args.stages,
+                "engine": args.engine,
+                "crossfade": args.crossfade,
+                "normalize": args.normalize,
+                "latency": args.latency,
+                "bandwidth": args.bandwidth * 1048576,
+                "catalog": max(args.catalog, videos),
+                "unusable": args.unusable,
+                "cache": args.cache,
+                "fixtures": str(fixtures),
+            }
+            result = run_child(spec, args.timeout)
+            results.append(result)
+            print(summarize(result), flush=True)
+
+    payload = {"environment": environment(), "results": results}
+    Path(args.output).write_text(json.dumps(payload, indent=2) + "\n")
+    print(f"Results written to {args.output}")
+    return 0 if all("error" not in result for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
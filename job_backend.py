@@ -0,0 +1,547 @@
+"""Pluggable job backends: where queued mashups wait and who runs them.
+
+``local`` keeps the queue and in-flight coalescing inside the web process
+(:class:`~job_queue.JobQueue` plus :class:`~job_queue.InflightJobs`), which
+is all a single gunicorn worker needs. ``sqlite`` (one host) and ``redis``
+(any number of hosts) share the queue, queue positions and coalescing
+between processes: web workers only enqueue, and :class:`JobWorker` threads
+(in ``worker.py`` processes or embedded in the web app) claim and run jobs.
+
+Every backend offers ``submit``, ``position``, ``depth``, ``active``,
+``attach``, ``discard``, ``finish`` and ``shutdown``; shared backends add
+``register``, ``unregister``, ``claim``, ``heartbeat``, ``complete`` and
+``reap`` for workers. All of them admit a job while it fits
+:func:`~job_queue.admits`; shared backends learn how many workers are idle
+from the thread counts that running workers register.
+"""
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from job_queue import InflightJobs, JobQueue, QueueFull, admits
+from redis_client import RedisClient
+
+BACKENDS = ("local", "sqlite", "redis")
+# Coalescing and payload keys outlive any job; they only expire if a
+# process died without cleaning up.
+REDIS_KEY_TTL = 24 * 3600
+
+
+class LocalJobBackend:
+    """In-process queue: jobs run on this process's ``workers`` threads."""
+
+    shared = False
+
+    def __init__(self, handler: Callable[[str, dict], None], workers: int, max_queued: int) -> None:
+        self.handler = handler
+        self._queue = JobQueue(workers=workers, max_queued=max_queued)
+        self._inflight = InflightJobs()
+
+    def submit(self, job_id: str, payload: dict) -> int:
+        return self._queue.submit(job_id, self.handler, job_id, payload)
+
+    def position(self, job_id: str) -> Optional[int]:
+        return self._queue.position(job_id)
+
+    def depth(self) -> int:
+        return self._queue.depth()
+
+    def active(self) -> int:
+        return self._queue.active()
+
+    def attach(self, fingerprint: str, job_id: str, email: str) -> Tuple[str, bool]:
+        return self._inflight.attach(fingerprint, job_id, email)
+
+    def discard(self, job_id: str) -> None:
+        self._inflight.discard(job_id)
+
+    def finish(self, job_id: str) -> List[str]:
+        return self._inflight.finish(job_id)
+
+    def shutdown(self, timeout: float = 60) -> list:
+        return self._queue.shutdown(timeout=timeout)
+
+
+class SqliteJobBackend:
+    """Queue shared by every process on one host through a SQLite file.
+
+    Jobs are claimed atomically like outbox rows. Queued jobs survive
+    restarts. A running job whose worker stops heartbeating is handed back
+    by :meth:`reap`.
+    """
+
+    shared = True
+
+    def __init__(self, db_path: Path, max_queued: int, poll_interval: float = 0.25) -> None:
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_queued = max(0, max_queued)
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS queue (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT NOT NULL UNIQUE,
+                    payload TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    worker TEXT,
+                    enqueued_at REAL NOT NULL,
+                    heartbeat_at REAL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS inflight (fingerprint TEXT PRIMARY KEY, job_id TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS workers ("
+                "worker TEXT PRIMARY KEY, threads INTEGER NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS recipients ("
+                "job_id TEXT NOT NULL, email TEXT NOT NULL, PRIMARY KEY (job_id, email))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def submit(self, job_id: str, payload: dict) -> int:
+        conn = self._connect()
+        with conn:
+            # The insert takes the write lock, so the counts below cannot
+            # race another submitter; over capacity rolls it back.
+            now = time.time()
+            conn.execute(
+                "INSERT INTO queue (job_id, payload, state, enqueued_at) VALUES (?, ?, 'queued', ?)",
+                (job_id, json.dumps(payload), now),
+            )
+            depth = conn.execute("SELECT COUNT(*) FROM queue WHERE state = 'queued'").fetchone()[0]
+            threads = conn.execute(
+                "SELECT COALESCE(SUM(threads), 0) FROM workers WHERE expires_at > ?", (now,)
+            ).fetchone()[0]
+            running = conn.execute("SELECT COUNT(*) FROM queue WHERE state = 'running'").fetchone()[0]
+            if not admits(depth - 1, threads - running, self.max_queued):
+                raise QueueFull("Server is busy.")
+        return depth
+
+    def register(self, worker: str, threads: int, ttl: float) -> None:
+        """Count ``threads`` job threads of ``worker`` for the next ``ttl`` seconds."""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO workers (worker, threads, expires_at) VALUES (?, ?, ?)",
+                (worker, threads, time.time() + ttl),
+            )
+
+    def unregister(self, worker: str) -> None:
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM workers WHERE worker = ?", (worker,))
+
+    def claim(self, worker: str, timeout: float) -> Optional[Tuple[str, dict]]:
+        """Take the oldest queued job, waiting up to ``timeout`` seconds."""
+        deadline = time.monotonic() + timeout
+        conn = self._connect()
+        while True:
+            row = conn.execute(
+                "SELECT job_id, payload FROM queue WHERE state = 'queued' ORDER BY seq LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                with conn:
+                    claimed = conn.execute(
+                        "UPDATE queue SET state = 'running', worker = ?, heartbeat_at = ? "
+                        "WHERE job_id = ? AND state = 'queued'",
+                        (worker, time.time(), row[0]),
+                    ).rowcount
+                if claimed:
+                    return row[0], json.loads(row[1])
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(self.poll_interval, remaining))
+
+    def heartbeat(self, job_ids: List[str]) -> None:
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "UPDATE queue SET heartbeat_at = ? WHERE job_id = ? AND state = 'running'",
+                [(time.time(), job_id) for job_id in job_ids],
+            )
+
+    def complete(self, job_id: str) -> None:
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM queue WHERE job_id = ?", (job_id,))
+
+    def reap(self, stale_after: float) -> List[str]:
+        """Drop running jobs whose worker went silent and return their ids."""
+        conn = self._connect()
+        with conn:
+            cutoff = time.time() - stale_after
+            lost = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT job_id FROM queue WHERE state = 'running' AND heartbeat_at < ?", (cutoff,)
+                )
+            ]
+            conn.executemany("DELETE FROM queue WHERE job_id = ?", [(job_id,) for job_id in lost])
+        return lost
+
+    def position(self, job_id: str) -> Optional[int]:
+        conn = self._connect()
+        row = conn.execute("SELECT seq, state FROM queue WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        if row[1] == "running":
+            return 0
+        return conn.execute(
+            "SELECT COUNT(*) FROM queue WHERE state = 'queued' AND seq <= ?", (row[0],)
+        ).fetchone()[0]
+
+    def depth(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM queue WHERE state = 'queued'").fetchone()[0]
+
+    def active(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM queue WHERE state = 'running'").fetchone()[0]
+
+    def attach(self, fingerprint: str, job_id: str, email: str) -> Tuple[str, bool]:
+        conn = self._connect()
+        with conn:
+            attached = not conn.execute(
+                "INSERT OR IGNORE INTO inflight (fingerprint, job_id) VALUES (?, ?)", (fingerprint, job_id)
+            ).rowcount
+            owner = conn.execute(
+                "SELECT job_id FROM inflight WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()[0]
+            conn.execute("INSERT OR IGNORE INTO recipients (job_id, email) VALUES (?, ?)", (owner, email))
+        return owner, attached
+
+    def discard(self, job_id: str) -> None:
+        self.finish(job_id)
+
+    def finish(self, job_id: str) -> List[str]:
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM inflight WHERE job_id = ?", (job_id,))
+            emails = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT email FROM recipients WHERE job_id = ? ORDER BY rowid", (job_id,)
+                )
+            ]
+            conn.execute("DELETE FROM recipients WHERE job_id = ?", (job_id,))
+        return emails
+
+    def shutdown(self, timeout: float = 60) -> list:
+        # Queued jobs stay in the file for the next worker.
+        return []
+
+
+class RedisJobBackend:
+    """Queue shared by processes on any number of hosts through Redis.
+
+    Uses the reliable-queue pattern: ``BRPOPLPUSH`` moves a job id from the
+    queue list to a running list in one step, so a job whose worker dies is
+    never lost, only reaped. Coalescing uses ``WATCH``/``MULTI`` so a
+    duplicate either joins a job before it finishes or starts a new one.
+    """
+
+    shared = True
+
+    def __init__(self, client: RedisClient, max_queued: int, prefix: str = "mashup") -> None:
+        self.client = client
+        self.max_queued = max(0, max_queued)
+        self.prefix = prefix
+        self.queue_key = f"{prefix}:queue"
+        self.running_key = f"{prefix}:running"
+        self.heartbeat_key = f"{prefix}:heartbeat"
+        self.workers_key = f"{prefix}:workers"
+
+    def _key(self, kind: str, name: str) -> str:
+        return f"{self.prefix}:{kind}:{name}"
+
+    def _inflight_key(self, fingerprint: str) -> str:
+        return self._key("inflight", hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:32])
+
+    def submit(self, job_id: str, payload: dict) -> int:
+        # WATCH the queue so a concurrent push between the length check and
+        # ours aborts the EXEC and the check runs again.
+        while True:
+            try:
+                self.client.execute("WATCH", self.queue_key)
+                waiting = self.client.execute("LLEN", self.queue_key)
+                idle = self._registered_threads() - self.client.execute("LLEN", self.running_key)
+                if not admits(waiting, idle, self.max_queued):
+                    self.client.execute("UNWATCH")
+                    raise QueueFull("Server is busy.")
+                self.client.execute("MULTI")
+                self.client.execute("SET", self._key("job", job_id), json.dumps(payload), "EX", REDIS_KEY_TTL)
+                self.client.execute("LPUSH", self.queue_key, job_id)
+                replies = self.client.execute("EXEC")
+            except QueueFull:
+                raise
+            except Exception:
+                self.client.close()
+                raise
+            if replies is not None:
+                # Newest ids are pushed on the left and workers pop from the
+                # right, so the new length is this job's place in line.
+                return replies[1]
+
+    def register(self, worker: str, threads: int, ttl: float) -> None:
+        """Count ``threads`` job threads of ``worker`` for the next ``ttl`` seconds."""
+        entry = json.dumps({"threads": threads, "expires_at": time.time() + ttl})
+        self.client.execute("HSET", self.workers_key, worker, entry)
+
+    def unregister(self, worker: str) -> None:
+        self.client.execute("HDEL", self.workers_key, worker)
+
+    def _registered_threads(self) -> int:
+        now = time.time()
+        flat = self.client.execute("HGETALL", self.workers_key) or []
+        threads = 0
+        for worker, raw in zip(flat[::2], flat[1::2]):
+            entry = json.loads(raw)
+            if entry["expires_at"] > now:
+                threads += entry["threads"]
+            else:
+                # A worker that died without unregistering.
+                self.client.execute("HDEL", self.workers_key, worker)
+        return threads
+
+    def claim(self, worker: str, timeout: float) -> Optional[Tuple[str, dict]]:
+        seconds = max(1, int(timeout))
+        job_id = self.client.execute(
+            "BRPOPLPUSH", self.queue_key, self.running_key, seconds,
+            timeout=self.client.timeout + seconds,
+        )
+        if job_id is None:
+            return None
+        self.client.execute("HSET", self.heartbeat_key, job_id, time.time())
+        payload = self.client.execute("GET", self._key("job", job_id))
+        if payload is None:
+            print(f"Job {job_id} expired before a worker claimed it.")
+            self.complete(job_id)
+            return None
+        return job_id, json.loads(payload)
+
+    def heartbeat(self, job_ids: List[str]) -> None:
+        if job_ids:
+            now = time.time()
+            fields = [value for job_id in job_ids for value in (job_id, now)]
+            self.client.execute("HSET", self.heartbeat_key, *fields)
+
+    def complete(self, job_id: str) -> None:
+        self.client.execute("LREM", self.running_key, 1, job_id)
+        self.client.execute("HDEL", self.heartbeat_key, job_id)
+        self.client.execute("DEL", self._key("job", job_id))
+
+    def reap(self, stale_after: float) -> List[str]:
+        """Drop running jobs whose worker went silent and return their ids.
+
+        Only the reaper whose ``LREM`` removes an id reports it, so several
+        workers can reap concurrently.
+        """
+        now = time.time()
+        lost = []
+        for job_id in self.client.execute("LRANGE", self.running_key, 0, -1) or []:
+            beat = self.client.execute("HGET", self.heartbeat_key, job_id)
+            if beat is None:
+                # Claimed but not yet stamped; start its clock now.
+                self.client.execute("HSETNX", self.heartbeat_key, job_id, now)
+                continue
+            if now - float(beat) > stale_after and self.client.execute("LREM", self.running_key, 1, job_id):
+                self.client.execute("HDEL", self.heartbeat_key, job_id)
+                self.client.execute("DEL", self._key("job", job_id))
+                lost.append(job_id)
+        return lost
+
+    def position(self, job_id: str) -> Optional[int]:
+        if job_id in (self.client.execute("LRANGE", self.running_key, 0, -1) or []):
+            return 0
+        waiting = self.client.execute("LRANGE", self.queue_key, 0, -1) or []
+        if job_id in waiting:
+            return len(waiting) - waiting.index(job_id)
+        return None
+
+    def depth(self) -> int:
+        return self.client.execute("LLEN", self.queue_key)
+
+    def active(self) -> int:
+        return self.client.execute("LLEN", self.running_key)
+
+    def attach(self, fingerprint: str, job_id: str, email: str) -> Tuple[str, bool]:
+        key = self._inflight_key(fingerprint)
+        while True:
+            try:
+                self.client.execute("WATCH", key)
+                owner = self.client.execute("GET", key)
+                attached = owner is not None
+                self.client.execute("MULTI")
+                if not attached:
+                    owner = job_id
+                    self.client.execute("SET", key, job_id, "EX", REDIS_KEY_TTL)
+                    self.client.execute("SET", self._key("owner", job_id), key, "EX", REDIS_KEY_TTL)
+                recipients = self._key("recipients", owner)
+                self.client.execute("SADD", recipients, email)
+                self.client.execute("EXPIRE", recipients, REDIS_KEY_TTL)
+                if self.client.execute("EXEC") is not None:
+                    return owner, attached
+            except Exception:
+                # Never leave this thread's connection inside a transaction.
+                self.client.close()
+                raise
+
+    def discard(self, job_id: str) -> None:
+        self.finish(job_id)
+
+    def finish(self, job_id: str) -> List[str]:
+        recipients = self._key("recipients", job_id)
+        owner_key = self._key("owner", job_id)
+        while True:
+            try:
+                self.client.execute("WATCH", recipients, owner_key)
+                inflight_key = self.client.execute("GET", owner_key)
+                emails = self.client.execute("SMEMBERS", recipients) or []
+                self.client.execute("MULTI")
+                self.client.execute("DEL", recipients, owner_key)
+                if inflight_key:
+                    self.client.execute("DEL", inflight_key)
+                if self.client.execute("EXEC") is not None:
+                    return sorted(emails)
+            except Exception:
+                self.client.close()
+                raise
+
+    def shutdown(self, timeout: float = 60) -> list:
+        # Queued jobs stay in Redis for the next worker.
+        return []
+
+
+def create_job_backend(
+    kind: str,
+    handler: Callable[[str, dict], None],
+    workers: int,
+    max_queued: int,
+    db_path: Path,
+    redis_url: str,
+):
+    if kind == "local":
+        return LocalJobBackend(handler, workers=workers, max_queued=max_queued)
+    if kind == "sqlite":
+        return SqliteJobBackend(db_path, max_queued=max_queued)
+    if kind == "redis":
+        return RedisJobBackend(RedisClient.from_url(redis_url), max_queued=max_queued)
+    raise ValueError(f"Unknown job backend {kind!r}; expected one of {', '.join(BACKENDS)}")
+
+
+class JobWorker:
+    """Claims jobs from a shared backend and runs ``handler(job_id, payload)``.
+
+    ``threads`` claim loops each run one job at a time. A heartbeat thread
+    stamps this worker's running jobs every ``heartbeat_interval`` seconds,
+    renews its registered thread count (which lets submitters see idle
+    workers) and reaps jobs that other workers stopped stamping for
+    ``stale_after`` seconds, passing each to ``on_lost(job_id)``.
+    :meth:`stop` stops claiming and lets running jobs finish until a timeout.
+    """
+
+    def __init__(
+        self,
+        backend,
+        handler: Callable[[str, dict], None],
+        threads: int = 1,
+        on_lost: Optional[Callable[[str], None]] = None,
+        heartbeat_interval: float = 15,
+        stale_after: float = 120,
+        poll_interval: float = 2,
+    ) -> None:
+        self.backend = backend
+        self.handler = handler
+        self.threads = max(1, threads)
+        self.on_lost = on_lost
+        # A live job must be stamped several times before it could look stale.
+        self.heartbeat_interval = min(heartbeat_interval, stale_after / 4)
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._running = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._stopped = threading.Event()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"mashup-job-worker-{index}", daemon=True)
+            for index in range(self.threads)
+        ]
+        self._beat = threading.Thread(target=self._heartbeat, name="mashup-job-heartbeat", daemon=True)
+
+    def start(self) -> None:
+        self.backend.register(self.worker_id, self.threads, self.stale_after)
+        for thread in self._workers:
+            thread.start()
+        self._beat.start()
+
+    def stop(self, timeout: float = 60) -> None:
+        self._stop.set()
+        try:
+            self.backend.unregister(self.worker_id)
+        except Exception as e:
+            print(f"Job worker could not unregister: {e}")
+        deadline = time.monotonic() + timeout
+        for thread in self._workers:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._stopped.set()
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self.backend.claim(self.worker_id, timeout=self.poll_interval)
+            except Exception as e:
+                print(f"Job worker could not claim a job: {e}")
+                self._stop.wait(self.poll_interval)
+                continue
+            if job is None:
+                continue
+            job_id, payload = job
+            with self._lock:
+                self._running.add(job_id)
+            try:
+                self.handler(job_id, payload)
+            except Exception as e:
+                print(f"Job {job_id} crashed: {e}")
+            finally:
+                with self._lock:
+                    self._running.discard(job_id)
+                try:
+                    self.backend.complete(job_id)
+                except Exception as e:
+                    print(f"Job {job_id} could not be marked complete: {e}")
+
+    def _heartbeat(self) -> None:
+        while not self._stopped.wait(self.heartbeat_interval):
+            try:
+                with self._lock:
+                    running = list(self._running)
+                self.backend.heartbeat(running)
+                if not self._stop.is_set():
+                    self.backend.register(self.worker_id, self.threads, self.stale_after)
+                for job_id in self.backend.reap(self.stale_after):
+                    print(f"Job {job_id} lost its worker.")
+                    if self.on_lost is not None:
+                        self.on_lost(job_id)
+            except Exception as e:
+                print(f"Job worker heartbeat failed: {e}")
@@ -0,0 +1,171 @@
+"""Web job scheduling: a bounded worker queue and in-flight request coalescing."""
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Optional, Tuple
+
+
+class QueueFull(RuntimeError):
+    pass
+
+
+def admits(waiting: int, idle_workers: int, max_queued: int) -> bool:
+    """Whether one more job may wait behind ``waiting`` others.
+
+    ``max_queued`` counts jobs left waiting once every idle worker has
+    picked one up, so the limit means the same on every job backend and
+    ``0`` still admits jobs while workers are free.
+    """
+    return waiting < max_queued + max(0, idle_workers)
+
+
+class JobQueue:
+    """Runs submitted jobs on ``workers`` threads, holding at most ``max_queued``.
+
+    Jobs are identified by an id so the web tier can report a queue position.
+    :meth:`shutdown` stops admissions and lets running and queued jobs drain
+    until a timeout, instead of killing them mid-encode.
+    """
+
+    def __init__(self, workers: int, max_queued: int) -> None:
+        self.workers = max(1, workers)
+        self.max_queued = max(0, max_queued)
+        self._pending = deque()
+        self._running = set()
+        self._closed = False
+        self._condition = threading.Condition()
+        self._threads = []
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._work, name=f"mashup-worker-{index}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, job_id: str, target: Callable, *args) -> int:
+        """Queue ``target(*args)`` and return its 1-based queue position.
+
+        Raises :class:`QueueFull` when the queue is at capacity or closed.
+        """
+        with self._condition:
+            if self._closed:
+                raise QueueFull("Server is shutting down.")
+            if not admits(len(self._pending), self.workers - len(self._running), self.max_queued):
+                raise QueueFull("Server is busy.")
+            self._pending.append((job_id, target, args))
+            self._condition.notify()
+            return len(self._pending)
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Return 0 if running, the 1-based queue position if waiting, else None."""
+        with self._condition:
+            if job_id in self._running:
+                return 0
+            for index, (pending_id, _, _) in enumerate(self._pending, 1):
+                if pending_id == job_id:
+                    return index
+            return None
+
+    def depth(self) -> int:
+        with self._condition:
+            return len(self._pending)
+
+    def active(self) -> int:
+        with self._condition:
+            return len(self._running)
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                job_id, target, args = self._pending.popleft()
+                self._running.add(job_id)
+            try:
+                target(*args)
+            except Exception as e:
+                print(f"Job {job_id} crashed: {e}")
+            finally:
+                with self._condition:
+                    self._running.discard(job_id)
+                    self._condition.notify_all()
+
+    def shutdown(self, timeout: float = 60) -> list:
+        """Stop admitting jobs and wait up to ``timeout`` seconds to drain.
+
+        Returns the ids of jobs that were still queued when time ran out;
+        they are dropped so the caller can mark them failed.
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            while self._pending or self._running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            dropped = [job_id for job_id, _, _ in self._pending]
+            self._pending.clear()
+        return dropped
+
+
+def request_fingerprint(
+    singer_name: str,
+    number_of_videos: int,
+    audio_duration: int,
+    crossfade: float = 0.0,
+    normalize: bool = False,
+) -> str:
+    """Identify requests that would produce the same mashup."""
+    singer = " ".join(singer_name.casefold().split())
+    fingerprint = f"{singer}|{number_of_videos}|{audio_duration}"
+    # Plain mashups keep their original key so cached results stay valid.
+    if crossfade or normalize:
+        fingerprint += f"|xf={crossfade:g}|norm={int(normalize)}"
+    return fingerprint
+
+
+class InflightJobs:
+    """Tracks running jobs by fingerprint so duplicates can share one run.
+
+    A duplicate submission is attached to the existing job and its email is
+    added to that job's recipients. :meth:`finish` detaches the job before
+    results are delivered, so later duplicates start (or hit a cache) anew
+    instead of joining a job whose emails have already gone out.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._by_fingerprint = {}
+        self._recipients = {}
+
+    def attach(self, fingerprint: str, job_id: str, email: str) -> Tuple[str, bool]:
+        """Return ``(job_id, attached)``; registers ``job_id`` if none is in flight."""
+        with self._lock:
+            existing = self._by_fingerprint.get(fingerprint)
+            if existing is not None:
+                recipients = self._recipients[existing]
+                if email not in recipients:
+                    recipients.append(email)
+                return existing, True
+            self._by_fingerprint[fingerprint] = job_id
+            self._recipients[job_id] = [email]
+            return job_id, False
+
+    def discard(self, job_id: str) -> None:
+        with self._lock:
+            self._drop(job_id)
+
+    def finish(self, job_id: str) -> List[str]:
+        """Detach ``job_id`` and return every email that asked for its result."""
+        with self._lock:
+            return self._drop(job_id)
+
+    def _drop(self, job_id: str) -> List[str]:
+        for fingerprint, owner in list(self._by_fingerprint.items()):
+            if owner == job_id:
+                del self._by_fingerprint[fingerprint]
+        return self._recipients.pop(job_id, [])
@@ -0,0 +1,465 @@
+"""Streaming MIME construction, SMTP delivery and the email outbox.
+
+Attachments are base64-encoded straight from disk into a spooled message
+file, and that file is streamed to the server during SMTP ``DATA``. Memory
+stays at a few chunks regardless of attachment size, instead of holding the
+raw file, its encoded copy and the flattened message at once.
+"""
+import base64
+import mimetypes
+import os
+import shutil
+import smtplib
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from email.message import EmailMessage
+from email.policy import SMTP
+from email.utils import formatdate, make_msgid
+from pathlib import Path
+from typing import Callable, List, Optional
+
+# 57 raw bytes encode to exactly one 76-character base64 line.
+ENCODE_CHUNK_BYTES = 57 * 1024
+# Outbox rows that may be claimed: due pending messages, plus messages whose
+# claimer's lease ran out (it died mid-send). Parameters: now, now - lease.
+CLAIMABLE_ROWS = (
+    "((status = 'pending' AND next_attempt_at <= ?) "
+    "OR (status = 'sending' AND claimed_at <= ?))"
+)
+
+
+def write_headers(out, headers: EmailMessage) -> None:
+    # Serialised by hand: a multipart Content-Type on a bare EmailMessage
+    # would make the generator emit an (empty) body of its own.
+    for name, value in headers.items():
+        out.write(SMTP.fold_binary(name, value))
+    out.write(b"\r\n")
+
+
+def build_mime_file(
+    sender: str,
+    recipient: str,
+    subject: str,
+    body: str,
+    attachment_path: Path,
+) -> Path:
+    """Write a multipart/mixed message to a temp file and return its path.
+
+    The caller owns the file and should delete it once delivered.
+    """
+    boundary = f"=_mashup_{uuid.uuid4().hex}"
+    content_type, _ = mimetypes.guess_type(attachment_path.name)
+    content_type = content_type or "application/octet-stream"
+
+    headers = EmailMessage(policy=SMTP)
+    headers["Subject"] = subject
+    headers["From"] = sender
+    headers["To"] = recipient
+    headers["Date"] = formatdate(localtime=True)
+    headers["Message-ID"] = make_msgid()
+    headers["MIME-Version"] = "1.0"
+    headers["Content-Type"] = f'multipart/mixed; boundary="{boundary}"'
+
+    text_part = EmailMessage(policy=SMTP)
+    text_part.set_content(body)
+
+    attachment_headers = EmailMessage(policy=SMTP)
+    attachment_headers["Content-Type"] = content_type
+    attachment_headers["Content-Transfer-Encoding"] = "base64"
+    attachment_headers.add_header(
+        "Content-Disposition", "attachment", filename=attachment_path.name
+    )
+
+    fd, message_name = tempfile.mkstemp(prefix="mashup_mail_", suffix=".eml")
+    with open(fd, "wb") as out:
+        write_headers(out, headers)
+        out.write(f"--{boundary}\r\n".encode("ascii"))
+        out.write(text_part.as_bytes())
+        out.write(f"\r\n--{boundary}\r\n".encode("ascii"))
+        write_headers(out, attachment_headers)
+        with attachment_path.open("rb") as source:
+            for chunk in iter(lambda: source.read(ENCODE_CHUNK_BYTES), b""):
+                out.write(base64.encodebytes(chunk).replace(b"\n", b"\r\n"))
+        out.write(f"\r\n--{boundary}--\r\n".encode("ascii"))
+    return Path(message_name)
+
+
+def build_text_file(sender: str, recipient: str, subject: str, body: str) -> Path:
+    """Write a plain text message (no attachment) to a temp file."""
+    message = EmailMessage(policy=SMTP)
+    message["Subject"] = subject
+    message["From"] = sender
+    message["To"] = recipient
+    message["Date"] = formatdate(localtime=True)
+    message["Message-ID"] = make_msgid()
+    message.set_content(body)
+    fd, message_name = tempfile.mkstemp(prefix="mashup_mail_", suffix=".eml")
+    with open(fd, "wb") as out:
+        out.write(message.as_bytes())
+    return Path(message_name)
+
+
+def send_mime_file(
+    smtp: smtplib.SMTP, sender: str, recipients: List[str], message_path: Path
+) -> None:
+    """Deliver a message file over an open SMTP connection without loading it.
+
+    This is ``SMTP.sendmail`` with the ``DATA`` payload streamed line by line
+    (dot-stuffed per RFC 5321) instead of passed in as one bytes object.
+    """
+    smtp.ehlo_or_helo_if_needed()
+    code, response = smtp.mail(sender)
+    if code != 250:
+        smtp.rset()
+        raise smtplib.SMTPSenderRefused(code, response, sender)
+    refused = {}
+    for recipient in recipients:
+        code, response = smtp.rcpt(recipient)
+        if code not in (250, 251):
+            refused[recipient] = (code, response)
+    if len(refused) == len(recipients):
+        smtp.rset()
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+    smtp.putcmd("data")
+    code, response = smtp.getreply()
+    if code != 354:
+        smtp.rset()
+        raise smtplib.SMTPDataError(code, response)
+    with message_path.open("rb") as message:
+        for line in message:
+            if line.startswith(b"."):
+                line = b"." + line
+            smtp.send(line)
+    smtp.send(b".\r\n")
+    code, response = smtp.getreply()
+    if code != 250:
+        raise smtplib.SMTPDataError(code, response)
+
+
+class SmtpSettings:
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: Optional[str],
+        password: Optional[str],
+        sender: str,
+        use_tls: bool,
+        timeout: float = 120,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender
+        self.use_tls = use_tls
+        self.timeout = timeout
+
+    @classmethod
+    def from_env(cls) -> "SmtpSettings":
+        username = os.getenv("SMTP_USERNAME")
+        return cls(
+            host=os.getenv("SMTP_HOST", "smtp.gmail.com"),
+            port=int(os.getenv("SMTP_PORT", "587")),
+            username=username,
+            password=os.getenv("SMTP_PASSWORD"),
+            sender=os.getenv("SENDER_EMAIL", username or ""),
+            use_tls=os.getenv("SMTP_USE_TLS", "true").lower() in {"1", "true", "yes"},
+        )
+
+    def problem(self) -> Optional[str]:
+        """Describe a configuration error that no retry can fix, if any."""
+        if not self.username or not self.password:
+            return "SMTP credentials missing."
+        if not self.sender:
+            return "SENDER_EMAIL missing."
+        return None
+
+
+class Outbox:
+    """Persistent email queue delivered by a background worker.
+
+    Messages live in SQLite with a hard link (or copy) of their attachment in
+    ``spool_dir``, so they survive restarts and the job's temp files. The
+    worker keeps one authenticated SMTP connection open across messages,
+    reconnecting when the server drops it or it sits idle, and retries
+    transient failures with exponential backoff up to ``max_attempts``.
+    Rows are claimed atomically under a lease (``claimed_by``/``claimed_at``),
+    so several processes may share one file; a row is only taken back from
+    its claimer once the lease has run out for ``lease_seconds``.
+    ``on_attempt(outcome, seconds)`` is told how each delivery attempt went
+    (``sent``, ``retry`` or ``failed``) and how long it took.
+    ``on_status(job_id, message_key, status)`` is told every status change
+    of a job's messages, so delivery can be reported beyond this host;
+    ``message_key`` is unique across outboxes.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        spool_dir: Path,
+        settings: SmtpSettings,
+        max_attempts: int = 5,
+        backoff_base: float = 30,
+        backoff_max: float = 3600,
+        idle_timeout: float = 60,
+        on_attempt: Optional[Callable[[str, float], None]] = None,
+        lease_seconds: float = 600,
+        on_status: Optional[Callable[[str, str, str], None]] = None,
+    ) -> None:
+        self.db_path = Path(db_path)
+        self.spool_dir = Path(spool_dir)
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self.settings = settings
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.idle_timeout = idle_timeout
+        self.on_attempt = on_attempt
+        self.lease_seconds = lease_seconds
+        self.on_status = on_status
+        # Row ids are only unique within one outbox file.
+        self.outbox_id = f"{socket.gethostname()}:{self.db_path.resolve()}"
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._smtp = None
+        self._smtp_used_at = 0.0
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT,
+                    recipient TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    attachment TEXT,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    sent_at REAL,
+                    claimed_by TEXT,
+                    claimed_at REAL
+                )
+                """
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(outbox)")}
+            for column, kind in (("claimed_by", "TEXT"), ("claimed_at", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE outbox ADD COLUMN {column} {kind}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(
+        self,
+        recipient: str,
+        subject: str,
+        body: str,
+        attachment_path: Optional[Path] = None,
+        job_id: Optional[str] = None,
+    ) -> int:
+        spooled = None
+        if attachment_path is not None:
+            spooled = self.spool_dir / f"{uuid.uuid4().hex}_{attachment_path.name}"
+            try:
+                os.link(attachment_path, spooled)
+            except OSError:
+                shutil.copy2(attachment_path, spooled)
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO outbox (job_id, recipient, subject, body, attachment, status, "
+                "next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?, 'pending', ?, ?)",
+                (job_id, recipient, subject, body, str(spooled) if spooled else None, now, now),
+            )
+        self._notify(job_id, cursor.lastrowid, "pending")
+        self._wake.set()
+        return cursor.lastrowid
+
+    def delivery_status(self, job_id: str) -> dict:
+        """Count a job's messages by status (pending/sending/sent/failed)."""
+        counts = {}
+        for status, count in self._connect().execute(
+            "SELECT status, COUNT(*) FROM outbox WHERE job_id = ? GROUP BY status", (job_id,)
+        ):
+            counts[status] = count
+        return counts
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="mashup-outbox", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._disconnect()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                delay = self.process_due()
+            except Exception as e:
+                print(f"Outbox worker error: {e}")
+                delay = self.backoff_base
+            if self._smtp is not None and time.monotonic() - self._smtp_used_at > self.idle_timeout:
+                self._disconnect()
+            self._wake.wait(min(delay, self.idle_timeout))
+            self._wake.clear()
+
+    def process_due(self) -> float:
+        """Send every message that is due; return seconds until the next one."""
+        while not self._stop.is_set():
+            row = self._claim()
+            if row is None:
+                break
+            self._deliver(*row)
+        # Expired leases (claimer died mid-send) count as due as well
+        next_at = self._connect().execute(
+            "SELECT MIN(CASE WHEN status = 'pending' THEN next_attempt_at ELSE claimed_at + ? END) "
+            "FROM outbox WHERE status IN ('pending', 'sending')",
+            (self.lease_seconds,),
+        ).fetchone()[0]
+        return max(0.5, next_at - time.time()) if next_at else self.idle_timeout
+
+    def _claim(self):
+        conn = self._connect()
+        while True:
+            now = time.time()
+            window = (now, now - self.lease_seconds)
+            row = conn.execute(
+                "SELECT id, recipient, subject, body, attachment, attempts, job_id FROM outbox "
+                f"WHERE {CLAIMABLE_ROWS} ORDER BY next_attempt_at LIMIT 1",
+                window,
+            ).fetchone()
+            if row is None:
+                return None
+            with conn:
+                claimed = conn.execute(
+                    "UPDATE outbox SET status = 'sending', claimed_by = ?, claimed_at = ? "
+                    f"WHERE id = ? AND {CLAIMABLE_ROWS}",
+                    (self.worker_id, now, row[0]) + window,
+                ).rowcount
+            if claimed:
+                self._notify(row[6], row[0], "sending")
+                return row
+
+    def _deliver(self, message_id, recipient, subject, body, attachment, attempts, job_id) -> None:
+        started = time.monotonic()
+        problem = self.settings.problem()
+        if problem:
+            self._finish(message_id, "failed", attempts + 1, problem, attachment, job_id)
+            self._report("failed", started)
+            print(f"Email to {recipient} not sent: {problem}")
+            return
+        message_path = None
+        try:
+            if attachment:
+                message_path = build_mime_file(
+                    self.settings.sender, recipient, subject, body, Path(attachment)
+                )
+            else:
+                message_path = build_text_file(self.settings.sender, recipient, subject, body)
+            try:
+                send_mime_file(self._connection(), self.settings.sender, [recipient], message_path)
+            except smtplib.SMTPServerDisconnected:
+                # The pooled connection went stale; retry once on a fresh one.
+                self._disconnect()
+                send_mime_file(self._connection(), self.settings.sender, [recipient], message_path)
+            self._smtp_used_at = time.monotonic()
+            self._finish(message_id, "sent", attempts + 1, None, attachment, job_id)
+            self._report("sent", started)
+            print(f"Email sent to {recipient}.")
+        except Exception as e:
+            self._disconnect()
+            attempts += 1
+            permanent = isinstance(e, (smtplib.SMTPAuthenticationError, smtplib.SMTPRecipientsRefused))
+            if permanent or attempts >= self.max_attempts:
+                self._finish(message_id, "failed", attempts, str(e), attachment, job_id)
+                self._report("failed", started)
+                print(f"Email to {recipient} failed permanently: {e}")
+            else:
+                delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+                with self._connect() as conn:
+                    owned = conn.execute(
+                        "UPDATE outbox SET status = 'pending', attempts = ?, next_attempt_at = ?, "
+                        "last_error = ?, claimed_by = NULL WHERE id = ? AND claimed_by = ?",
+                        (attempts, time.time() + delay, str(e), message_id, self.worker_id),
+                    ).rowcount
+                if owned:
+                    self._notify(job_id, message_id, "pending")
+                self._report("retry", started)
+                print(f"Email to {recipient} failed ({e}); retry {attempts} in {delay:.0f}s")
+        finally:
+            if message_path is not None:
+                message_path.unlink(missing_ok=True)
+
+    def _report(self, outcome: str, started: float) -> None:
+        if self.on_attempt is not None:
+            try:
+                self.on_attempt(outcome, time.monotonic() - started)
+            except Exception as e:
+                print(f"Outbox attempt hook failed: {e}")
+
+    def _notify(self, job_id: Optional[str], message_id: int, status: str) -> None:
+        if self.on_status is not None and job_id:
+            try:
+                self.on_status(job_id, f"{self.outbox_id}:{message_id}", status)
+            except Exception as e:
+                print(f"Outbox status hook failed: {e}")
+
+    def _finish(self, message_id, status, attempts, error, attachment, job_id) -> None:
+        with self._connect() as conn:
+            # A row whose lease was taken over belongs to its new claimer
+            owned = conn.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, last_error = ?, sent_at = ? "
+                "WHERE id = ? AND claimed_by = ?",
+                (status, attempts, error, time.time() if status == "sent" else None, message_id,
+                 self.worker_id),
+            ).rowcount
+        if owned:
+            self._notify(job_id, message_id, status)
+        if owned and attachment:
+            Path(attachment).unlink(missing_ok=True)
+
+    def _connection(self) -> smtplib.SMTP:
+        if self._smtp is None:
+            smtp = smtplib.SMTP(
+                host=self.settings.host, port=self.settings.port, timeout=self.settings.timeout
+            )
+            try:
+                if self.settings.use_tls:
+                    smtp.starttls()
+                smtp.login(self.settings.username, self.settings.password)
+            except Exception:
+                smtp.close()
+                raise
+            self._smtp = smtp
+        return self._smtp
+
+    def _disconnect(self) -> None:
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                self._smtp.close()
+            self._smtp = None
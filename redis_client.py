@@ -0,0 +1,138 @@
+"""A minimal Redis (RESP2) client for the shared job backend and status store.
+
+Speaks just enough of the wire protocol for commands, replies and
+``WATCH``/``MULTI``/``EXEC`` transactions, so Redis-compatible servers
+(Redis, Valkey, KeyDB) work without adding redis-py as a dependency.
+"""
+import socket
+import threading
+from typing import Optional
+from urllib.parse import unquote, urlparse
+
+
+class RedisError(RuntimeError):
+    pass
+
+
+class RedisClient:
+    """Thread-safe client holding one connection per thread.
+
+    Per-thread connections keep a blocking command (``BRPOPLPUSH``) from
+    stalling other threads, and keep each transaction on the connection
+    that started it. A broken connection is dropped and reopened on the
+    next command.
+    """
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 6379,
+        db: int = 0,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        timeout: float = 10,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.db = db
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisClient":
+        """Build a client from ``redis://[[user]:password@]host[:port][/db]``."""
+        parsed = urlparse(url)
+        if parsed.scheme != "redis":
+            raise ValueError(f"Unsupported Redis URL scheme: {parsed.scheme or url}")
+        return cls(
+            host=parsed.hostname or "localhost",
+            port=parsed.port or 6379,
+            db=int(parsed.path.strip("/") or 0),
+            username=unquote(parsed.username) if parsed.username else None,
+            password=unquote(parsed.password) if parsed.password else None,
+        )
+
+    def execute(self, *args, timeout: Optional[float] = None):
+        """Send one command and return its decoded reply.
+
+        ``timeout`` overrides the socket timeout, e.g. for blocking pops.
+        Error replies raise :class:`RedisError`.
+        """
+        conn = self._connection()
+        try:
+            conn.settimeout(self.timeout if timeout is None else timeout)
+            conn.sendall(encode_command(args))
+            reply = read_reply(self._local.reader)
+        except (OSError, EOFError):
+            self.close()
+            raise
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+            self._local.conn = None
+
+    def _connection(self) -> socket.socket:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            self._local.conn = conn
+            self._local.reader = conn.makefile("rb")
+            try:
+                if self.password:
+                    credentials = (self.username, self.password) if self.username else (self.password,)
+                    self.execute("AUTH", *credentials)
+                if self.db:
+                    self.execute("SELECT", self.db)
+            except RedisError:
+                self.close()
+                raise
+        return conn
+
+
+def encode_command(args) -> bytes:
+    parts = [f"*{len(args)}\r\n".encode("ascii")]
+    for arg in args:
+        if isinstance(arg, bytes):
+            data = arg
+        else:
+            data = str(arg).encode("utf-8")
+        parts.append(f"${len(data)}\r\n".encode("ascii"))
+        parts.append(data + b"\r\n")
+    return b"".join(parts)
+
+
+def read_reply(reader):
+    line = reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise EOFError("Connection closed by the Redis server.")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode("utf-8")
+    if kind == b"-":
+        return RedisError(payload.decode("utf-8"))
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        if len(data) != length + 2:
+            raise EOFError("Connection closed by the Redis server.")
+        return data[:-2].decode("utf-8")
+    if kind == b"*":
+        count = int(payload)
+        if count < 0:
+            return None
+        return [read_reply(reader) for _ in range(count)]
+    raise RedisError(f"Unexpected reply from Redis: {line[:40]!r}")
@@ -0,0 +1,290 @@
+"""Cache of finished mashups in static_results, plus its cleanup janitor."""
+import json
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from redis_client import RedisClient
+
+TEMP_DIR_PREFIXES = ("mashup_web_", "mashup_cli_")
+# Per-job HLS previews live in <root>/streams/<file_id stem>.
+STREAMS_DIR_NAME = "streams"
+ENTRY_FIELDS = ("file_id", "zip_name", "size", "created_at", "last_used_at")
+
+
+class ResultCache:
+    """Index of finished artifacts keyed by request fingerprint.
+
+    Each entry owns a preview MP4 and the emailed zip in ``root``. Entries
+    are evicted least-recently-used first once their total size exceeds
+    ``max_bytes``, and unconditionally once older than ``max_age`` seconds.
+    ``on_evict(file_id)`` lets the web tier mark the job as expired.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        db_path: Path,
+        max_bytes: int,
+        max_age: float,
+        on_evict: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self.root = Path(root)
+        self.db_path = Path(db_path)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.on_evict = on_evict
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                    fingerprint TEXT PRIMARY KEY,
+                    file_id TEXT NOT NULL,
+                    zip_name TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, fingerprint: str) -> Optional[dict]:
+        """Return ``{"file_id", "zip_path"}`` for a live entry and mark it used."""
+        entry = self._lookup(fingerprint)
+        if entry is None:
+            return None
+        video_path = self.root / entry["file_id"]
+        zip_path = self.root / entry["zip_name"]
+        if time.time() - entry["created_at"] > self.max_age or not (video_path.exists() and zip_path.exists()):
+            self._remove(fingerprint, entry)
+            return None
+        self._touch(fingerprint, time.time())
+        return {"file_id": entry["file_id"], "zip_path": zip_path}
+
+    def put(self, fingerprint: str, file_id: str, zip_path: Path) -> None:
+        video_path = self.root / file_id
+        size = video_path.stat().st_size + zip_path.stat().st_size
+        now = time.time()
+        previous = self._lookup(fingerprint)
+        self._store(
+            fingerprint,
+            {"file_id": file_id, "zip_name": zip_path.name, "size": size, "created_at": now, "last_used_at": now},
+        )
+        if previous and previous["file_id"] != file_id:
+            self._delete_files(previous["file_id"], previous["zip_name"])
+        self.evict()
+
+    def tracked_names(self) -> set:
+        names = set()
+        for _, entry in self._entries():
+            names.update((entry["file_id"], entry["zip_name"]))
+        return names
+
+    def evict(self) -> None:
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda item: item[1]["last_used_at"])
+            total = sum(entry["size"] for _, entry in entries)
+            now = time.time()
+            for fingerprint, entry in entries:
+                if total <= self.max_bytes and now - entry["created_at"] <= self.max_age:
+                    continue
+                self._remove(fingerprint, entry)
+                total -= entry["size"]
+
+    def _remove(self, fingerprint: str, entry: dict) -> None:
+        # Only the process whose delete took the entry cleans up after it.
+        if not self._delete(fingerprint):
+            return
+        self._delete_files(entry["file_id"], entry["zip_name"])
+        if self.on_evict is not None:
+            self.on_evict(entry["file_id"])
+
+    # Index storage; RedisResultCache keeps the same entries in Redis.
+
+    def _lookup(self, fingerprint: str) -> Optional[dict]:
+        row = self._connect().execute(
+            f"SELECT {', '.join(ENTRY_FIELDS)} FROM results WHERE fingerprint = ?", (fingerprint,)
+        ).fetchone()
+        return dict(zip(ENTRY_FIELDS, row)) if row else None
+
+    def _entries(self) -> List[Tuple[str, dict]]:
+        return [
+            (row[0], dict(zip(ENTRY_FIELDS, row[1:])))
+            for row in self._connect().execute(f"SELECT fingerprint, {', '.join(ENTRY_FIELDS)} FROM results")
+        ]
+
+    def _store(self, fingerprint: str, entry: dict) -> None:
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO results (fingerprint, {', '.join(ENTRY_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                (fingerprint,) + tuple(entry[field] for field in ENTRY_FIELDS),
+            )
+
+    def _touch(self, fingerprint: str, now: float) -> None:
+        conn = self._connect()
+        with conn:
+            conn.execute("UPDATE results SET last_used_at = ? WHERE fingerprint = ?", (now, fingerprint))
+
+    def _delete(self, fingerprint: str) -> bool:
+        conn = self._connect()
+        with conn:
+            return bool(conn.execute("DELETE FROM results WHERE fingerprint = ?", (fingerprint,)).rowcount)
+
+    def _delete_files(self, file_id: str, zip_name: str) -> None:
+        for name in (file_id, zip_name):
+            (self.root / name).unlink(missing_ok=True)
+        shutil.rmtree(self.root / STREAMS_DIR_NAME / Path(file_id).stem, ignore_errors=True)
+
+
+class RedisResultCache(ResultCache):
+    """:class:`ResultCache` whose index lives in Redis, for several hosts.
+
+    The artifacts stay in ``root``, which must then be shared storage; the
+    index is one hash of JSON entries keyed by fingerprint, so every web
+    host sees every cached result and exactly one host evicts each entry.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        client: RedisClient,
+        max_bytes: int,
+        max_age: float,
+        on_evict: Optional[Callable[[str], None]] = None,
+        prefix: str = "mashup",
+    ) -> None:
+        self.root = Path(root)
+        self.client = client
+        self.key = f"{prefix}:results"
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.on_evict = on_evict
+        self._lock = threading.Lock()
+
+    def _lookup(self, fingerprint: str) -> Optional[dict]:
+        raw = self.client.execute("HGET", self.key, fingerprint)
+        return json.loads(raw) if raw else None
+
+    def _entries(self) -> List[Tuple[str, dict]]:
+        flat = self.client.execute("HGETALL", self.key) or []
+        return [(flat[index], json.loads(flat[index + 1])) for index in range(0, len(flat), 2)]
+
+    def _store(self, fingerprint: str, entry: dict) -> None:
+        self.client.execute("HSET", self.key, fingerprint, json.dumps(entry))
+
+    def _touch(self, fingerprint: str, now: float) -> None:
+        # WATCH keeps a concurrent eviction from being undone by this write.
+        while True:
+            try:
+                self.client.execute("WATCH", self.key)
+                entry = self._lookup(fingerprint)
+                if entry is None:
+                    self.client.execute("UNWATCH")
+                    return
+                entry["last_used_at"] = now
+                self.client.execute("MULTI")
+                self._store(fingerprint, entry)
+                if self.client.execute("EXEC") is not None:
+                    return
+            except Exception:
+                self.client.close()
+                raise
+
+    def _delete(self, fingerprint: str) -> bool:
+        return bool(self.client.execute("HDEL", self.key, fingerprint))
+
+
+class Janitor:
+    """Background sweeper for the result cache and leftovers from dead jobs.
+
+    Every ``interval`` seconds it evicts cache entries, deletes orphaned
+    legacy ``<id>.txt`` status files and untracked artifacts in ``root``
+    older than ``max_age``, and removes ``mashup_web_``/``mashup_cli_`` temp dirs that
+    have not been touched for ``temp_max_age`` seconds. Stream previews of
+    jobs that never produced a cached result go after ``temp_max_age`` too.
+    """
+
+    def __init__(
+        self,
+        cache: ResultCache,
+        interval: float,
+        temp_max_age: float,
+        is_active: Callable[[str], bool],
+    ) -> None:
+        self.cache = cache
+        self.interval = interval
+        self.temp_max_age = temp_max_age
+        self.is_active = is_active
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="mashup-janitor", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Janitor sweep failed: {e}")
+
+    def sweep(self) -> None:
+        self.cache.evict()
+        now = time.time()
+        tracked = self.cache.tracked_names()
+        for path in self.cache.root.iterdir():
+            if not path.is_file() or path.name in tracked or ".sqlite3" in path.name:
+                continue
+            if path.suffix == ".txt":
+                # Status files from before the status store; orphaned once
+                # their artifact is gone.
+                if not path.with_suffix("").exists():
+                    path.unlink(missing_ok=True)
+                continue
+            job_id = path.name if path.suffix == ".mp4" else f"{path.stem}.mp4"
+            if self.is_active(job_id):
+                continue
+            try:
+                if now - path.stat().st_mtime > self.cache.max_age:
+                    path.unlink()
+            except OSError:
+                pass
+
+        streams = self.cache.root / STREAMS_DIR_NAME
+        for path in streams.iterdir() if streams.is_dir() else ():
+            if not path.is_dir() or f"{path.name}.mp4" in tracked:
+                continue
+            if self.is_active(f"{path.name}.mp4"):
+                continue
+            try:
+                if now - path.stat().st_mtime > self.temp_max_age:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
+
+        for path in Path(tempfile.gettempdir()).iterdir():
+            if not path.is_dir() or not path.name.startswith(TEMP_DIR_PREFIXES):
+                continue
+            try:
+                if now - path.stat().st_mtime > self.temp_max_age:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
@@ -0,0 +1,273 @@
+"""Job status store: in-memory records written through to SQLite (or Redis)."""
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from redis_client import RedisClient
+
+FINAL_STATUSES = {"Done", "Failed"}
+# Finished jobs beyond this many are dropped from memory (SQLite keeps them).
+MAX_CACHED_JOBS = 1000
+
+COLUMNS = (
+    "job_id",
+    "status",
+    "stage",
+    "message",
+    "percent",
+    "error",
+    "created_at",
+    "updated_at",
+    "finished_at",
+    "version",
+)
+
+
+def new_job(job_id: str, now: float) -> dict:
+    return {
+        "job_id": job_id,
+        "created_at": now,
+        "stage": None,
+        "percent": None,
+        "error": None,
+        "finished_at": None,
+        "version": 0,
+    }
+
+
+def apply_update(
+    job: dict,
+    status: str,
+    message: str,
+    stage: Optional[str],
+    percent: Optional[float],
+    error: Optional[str],
+    now: float,
+) -> dict:
+    job.update(status=status, message=message, updated_at=now)
+    if stage is not None:
+        job["stage"] = stage
+    if percent is not None:
+        job["percent"] = round(max(0.0, min(100.0, float(percent))), 1)
+    if status == "Done":
+        job["percent"] = 100.0
+    if status == "Failed":
+        job["error"] = error or message
+    if status in FINAL_STATUSES:
+        job["finished_at"] = now
+    job["version"] += 1
+    return job
+
+
+class StatusStore:
+    """Holds the latest status of every job and lets readers wait for changes.
+
+    Reads are served from memory; every update is also written to SQLite so
+    a restarted process (or another reader of the same file) still sees the
+    last known state. ``wait_for_change`` backs the long-poll and SSE routes.
+
+    With ``shared=True`` other processes also write the file (web workers
+    and ``worker.py`` on one host), so every read goes to SQLite, updates
+    are read-modify-write transactions, and waiters poll every
+    ``poll_interval`` seconds for changes made elsewhere.
+    """
+
+    def __init__(self, db_path: Path, shared: bool = False, poll_interval: float = 0.5) -> None:
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.shared = shared
+        self.poll_interval = poll_interval
+        self._jobs = {}
+        self._condition = threading.Condition()
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    message TEXT,
+                    percent REAL,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    finished_at REAL,
+                    version INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def update(
+        self,
+        job_id: str,
+        status: str,
+        message: str = "",
+        stage: Optional[str] = None,
+        percent: Optional[float] = None,
+        error: Optional[str] = None,
+    ) -> dict:
+        now = time.time()
+        with self._condition:
+            conn = self._connect()
+            with conn:
+                if self.shared:
+                    # Hold the write lock across the read so concurrent
+                    # writers in other processes cannot lose a version.
+                    conn.execute("BEGIN IMMEDIATE")
+                job = self._lookup(job_id) or new_job(job_id, now)
+                apply_update(job, status, message, stage, percent, error, now)
+                self._save(conn, job)
+            if not self.shared:
+                self._jobs[job_id] = job
+                self._trim()
+            self._condition.notify_all()
+            return dict(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._condition:
+            job = self._lookup(job_id)
+            return dict(job) if job else None
+
+    def wait_for_change(self, job_id: str, version: int, timeout: float) -> Optional[dict]:
+        """Block until the job's version differs from ``version`` or time runs out."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                job = self._lookup(job_id)
+                if job is None or job["version"] != version:
+                    return dict(job) if job else None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return dict(job)
+                if self.shared:
+                    remaining = min(remaining, self.poll_interval)
+                self._condition.wait(remaining)
+
+    def _lookup(self, job_id: str) -> Optional[dict]:
+        if self.shared:
+            return self._load(job_id)
+        job = self._jobs.get(job_id) or self._load(job_id)
+        if job is not None:
+            self._jobs[job_id] = job
+        return job
+
+    def _trim(self) -> None:
+        if len(self._jobs) <= MAX_CACHED_JOBS:
+            return
+        finished = sorted(
+            (job["updated_at"], job_id)
+            for job_id, job in self._jobs.items()
+            if job["status"] in FINAL_STATUSES
+        )
+        for _, job_id in finished[: len(self._jobs) - MAX_CACHED_JOBS]:
+            del self._jobs[job_id]
+
+    def _load(self, job_id: str) -> Optional[dict]:
+        row = self._connect().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(COLUMNS, row))
+
+    def _save(self, conn: sqlite3.Connection, job: dict) -> None:
+        conn.execute(
+            f"INSERT OR REPLACE INTO jobs ({', '.join(COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+            tuple(job[column] for column in COLUMNS),
+        )
+
+
+class RedisStatusStore:
+    """:class:`StatusStore` kept in Redis, for web workers on several hosts.
+
+    Each job is one JSON value that expires ``ttl`` seconds after its last
+    update. Updates are ``WATCH``/``MULTI`` transactions; waiters poll
+    every ``poll_interval`` seconds. Email delivery is kept next to each
+    job, one hash field per message, so every host's outbox reports into it.
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        client: RedisClient,
+        prefix: str = "mashup",
+        ttl: int = 7 * 24 * 3600,
+        poll_interval: float = 0.5,
+    ) -> None:
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.prefix}:status:{job_id}"
+
+    def update(
+        self,
+        job_id: str,
+        status: str,
+        message: str = "",
+        stage: Optional[str] = None,
+        percent: Optional[float] = None,
+        error: Optional[str] = None,
+    ) -> dict:
+        key = self._key(job_id)
+        while True:
+            now = time.time()
+            try:
+                self.client.execute("WATCH", key)
+                raw = self.client.execute("GET", key)
+                job = json.loads(raw) if raw else new_job(job_id, now)
+                apply_update(job, status, message, stage, percent, error, now)
+                self.client.execute("MULTI")
+                self.client.execute("SET", key, json.dumps(job), "EX", self.ttl)
+                if self.client.execute("EXEC") is not None:
+                    return job
+            except Exception:
+                # Never leave this thread's connection inside a transaction.
+                self.client.close()
+                raise
+
+    def get(self, job_id: str) -> Optional[dict]:
+        raw = self.client.execute("GET", self._key(job_id))
+        return json.loads(raw) if raw else None
+
+    def record_delivery(self, job_id: str, message_key: str, status: str) -> None:
+        """Store one email's delivery status (an ``Outbox`` ``on_status`` hook)."""
+        key = f"{self.prefix}:delivery:{job_id}"
+        self.client.execute("HSET", key, message_key, status)
+        self.client.execute("EXPIRE", key, self.ttl)
+
+    def delivery_status(self, job_id: str) -> dict:
+        """Count a job's emails by status, across every host's outbox."""
+        flat = self.client.execute("HGETALL", f"{self.prefix}:delivery:{job_id}") or []
+        counts = {}
+        for status in flat[1::2]:
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def wait_for_change(self, job_id: str, version: int, timeout: float) -> Optional[dict]:
+        """Block until the job's version differs from ``version`` or time runs out."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job["version"] != version:
+                return job
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return job
+            time.sleep(min(remaining, self.poll_interval))
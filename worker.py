@@ -0,0 +1,71 @@
+"""Standalone job worker for the shared (sqlite / redis) job backends.
+
+Web workers enqueue mashups; this process claims and runs them, so
+encoding scales independently of request handling. Run as many as the
+host (or cluster) can take:
+
+    MASHUP_JOB_BACKEND=redis MASHUP_REDIS_URL=redis://queue:6379/0 python worker.py
+
+SIGTERM/SIGINT stop claiming new jobs and let running ones finish for up to
+``MASHUP_DRAIN_TIMEOUT`` seconds. Set ``MASHUP_WORKER_METRICS_PORT`` to
+serve this process's ``/metrics`` (stage timings are recorded where jobs
+run, not in the web process).
+"""
+import os
+import signal
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Keep app's import from starting the web role's services; main() starts
+# the ones a worker needs.
+os.environ["MASHUP_PROCESS_ROLE"] = "worker"
+import app as web  # noqa: E402
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = web.METRICS.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", web.METRICS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port: int) -> None:
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="mashup-worker-metrics", daemon=True).start()
+    print(f"Worker metrics on port {port}")
+
+
+def main() -> int:
+    if not web.JOB_BACKEND.shared:
+        print("worker.py needs a shared job backend: set MASHUP_JOB_BACKEND to sqlite or redis.")
+        return 1
+    threads = int(os.getenv("MASHUP_WORKERS", "2"))
+    metrics_port = os.getenv("MASHUP_WORKER_METRICS_PORT")
+    if metrics_port:
+        serve_metrics(int(metrics_port))
+
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
+
+    web.start_services(run_jobs=True)
+    worker = web.start_job_worker(threads)
+    print(f"Worker {worker.worker_id} running {threads} job thread(s) from the {web.JOB_BACKEND_KIND} backend.")
+    stop.wait()
+    print("Stopping: finishing running jobs...")
+    web.drain_jobs()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())